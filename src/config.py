@@ -1,35 +1,37 @@
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
 
-from decouple import config
-
 from src.services.supbase import Supabase
+from src.settings import SETTINGS
 
 BASE_DIR: Path = Path(__file__).resolve().parent.parent
-_IN_PRODUCTION = config('PRODUCTION', default=False, cast=bool)
-_TEST_MODE = config('TEST_MODE', default=False, cast=bool)
+_IN_PRODUCTION = SETTINGS.IN_PRODUCTION
+_TEST_MODE = SETTINGS.TEST_MODE
 
 # format = r"%(asctime)s - %(levelname)-7s [%(filename)s:%(lineno)03d - %(funcName)34s()] - %(message)s"
 format = r"%(asctime)s - %(levelname)-7s [%(filename)-13s:%(lineno)03d - %(funcName)30s()] - %(message)s"
 logging.basicConfig(level=logging.INFO, format=format)
+# The format does not use thread/process data, so the records skip looking them up
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 for noisy_logger in ["google_auth_httplib2", "googleapiclient"]:
     logging.getLogger(noisy_logger).setLevel(logging.WARNING)
 log = logging.getLogger(__name__)
 
 
-class Config:
-    """Static class container for all variables."""
-    _BASE_DIR = Path(__file__).resolve().parent.parent
-
-    class DIRECTORIES:
-        """Container for any directories you require for your automation.
+@dataclass(frozen=True, slots=True)
+class Directories:
+    """Container for any directories you require for your automation."""
+    TEMP: Path = Path('/tmp')
 
-        Folders will be created automatically
-        """
 
-        TEMP =  Path('/tmp')
-
-    objects = Supabase()
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Container for all variables, instantiated once as CONFIG."""
+    DIRECTORIES: Directories = Directories()
+    objects: Supabase = field(default_factory=Supabase)
 
 
 CONFIG = Config()
@@ -1,50 +1,51 @@
-from decouple import config, Csv
+import re
+
+from src.settings import SETTINGS
 
 # Business
-LOGI_NIT = config('LOGI_NIT')
-USER_ID = config('USER_ID')
-USERNAME = config('LOGI_NIT')
-MUTUALSER_USERNAME = config('MUTUALSER_USERNAME')
-MUTUALSER_PASSWORD = config('MUTUALSER_PASSWORD')
-EMAILS_PER_EXECUTION =  config('EMAILS_PER_EXECUTION', cast=int)
+LOGI_NIT = SETTINGS.LOGI_NIT
+USER_ID = SETTINGS.USER_ID
+MUTUALSER_USERNAME = SETTINGS.MUTUALSER_USERNAME
+MUTUALSER_PASSWORD = SETTINGS.MUTUALSER_PASSWORD
+EMAILS_PER_EXECUTION = SETTINGS.EMAILS_PER_EXECUTION
+MAX_WORKERS = SETTINGS.MAX_WORKERS
 
 # Web
-BASE_URL_AUTH = config('BASE_URL_AUTH')
-BASE_URL_API = config('BASE_URL_API')
-PORTAL_URL = config('PORTAL_URL')
+BASE_URL_AUTH = SETTINGS.BASE_URL_AUTH
+BASE_URL_API = SETTINGS.BASE_URL_API
+PORTAL_URL = SETTINGS.PORTAL_URL
 
 # External Services
-GOOGLE_TOKEN = config('GOOGLE_TOKEN')
-GOOGLE_REFRESH_TOKEN = config('GOOGLE_REFRESH_TOKEN')
-GOOGLE_TOKEN_URI = config('GOOGLE_TOKEN_URI')
-GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
-GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET')
-GOOGLE_SCOPES = config('GOOGLE_SCOPES', cast=Csv())
-
-LOGISTICA_GOOGLE_TOKEN = config('LOG_GOOGLE_TOKEN')
-LOGISTICA_GOOGLE_REFRESH_TOKEN = config('LOG_GOOGLE_REFRESH_TOKEN')
-LOGISTICA_GOOGLE_TOKEN_URI = config('GOOGLE_TOKEN_URI')
-LOGISTICA_GOOGLE_CLIENT_ID = config('LOG_GOOGLE_CLIENT_ID')
-LOGISTICA_GOOGLE_CLIENT_SECRET = config('LOG_GOOGLE_CLIENT_SECRET')
-LOGISTICA_GOOGLE_SCOPES = config('LOG_GOOGLE_SCOPES', cast=Csv())
+GOOGLE_TOKEN = SETTINGS.GOOGLE_TOKEN
+GOOGLE_REFRESH_TOKEN = SETTINGS.GOOGLE_REFRESH_TOKEN
+GOOGLE_TOKEN_URI = SETTINGS.GOOGLE_TOKEN_URI
+GOOGLE_CLIENT_ID = SETTINGS.GOOGLE_CLIENT_ID
+GOOGLE_CLIENT_SECRET = SETTINGS.GOOGLE_CLIENT_SECRET
+GOOGLE_SCOPES = SETTINGS.GOOGLE_SCOPES
+
+LOGISTICA_GOOGLE_TOKEN = SETTINGS.LOG_GOOGLE_TOKEN
+LOGISTICA_GOOGLE_REFRESH_TOKEN = SETTINGS.LOG_GOOGLE_REFRESH_TOKEN
+LOGISTICA_GOOGLE_CLIENT_ID = SETTINGS.LOG_GOOGLE_CLIENT_ID
+LOGISTICA_GOOGLE_CLIENT_SECRET = SETTINGS.LOG_GOOGLE_CLIENT_SECRET
+LOGISTICA_GOOGLE_SCOPES = SETTINGS.LOG_GOOGLE_SCOPES
 
 # Spreadsheets
-SPREADSHEET_ID = config('SPREADSHEET_ID')
+SPREADSHEET_ID = SETTINGS.SPREADSHEET_ID
 
 # Drive
-FACTURAS_PDF = config('FACTURAS_PDF')
-FACTURAS_PROCESADAS = config('FACTURAS_PROCESADAS')
-FACTURAS_TMP = config('FACTURAS_TMP')
+FACTURAS_PDF = SETTINGS.FACTURAS_PDF
+FACTURAS_PROCESADAS = SETTINGS.FACTURAS_PROCESADAS
+FACTURAS_TMP = SETTINGS.FACTURAS_TMP
 
-XMLS_MUTUALSER = config('XMLS_MUTUALSER')
+XMLS_MUTUALSER = SETTINGS.XMLS_MUTUALSER
 
 # Supabase
-SUPABASE_URL = config('SUPABASE_URL')
-SUPABASE_KEY = config('SUPABASE_KEY')
-TABLE_FAC_PROCS = config('TABLE_FAC_PROCS')
+SUPABASE_URL = SETTINGS.SUPABASE_URL
+SUPABASE_KEY = SETTINGS.SUPABASE_KEY
+TABLE_FAC_PROCS = SETTINGS.TABLE_FAC_PROCS
 
 # Gmail
-GMAIL_QUERY = config("GMAIL_QUERY")
+GMAIL_QUERY = SETTINGS.GMAIL_QUERY
 
 class Reasons:
     FILE_NOT_FOUND_MUTUAL_SER = 'Archivo no encontrado al intentar ser enviado a Mutualser'
@@ -57,6 +58,11 @@ class Subjects:
     INCONSISTENCY_TOTAL_INVOICE = "{nro_factura} (recibida el {fecha_correo_recibido}) - Factura rechazada por Mutualser por inconsistencia en el valor total"
     RETRY_FAILED = "{nro_factura} - No se pudo cargar la factura después de varios intentos"
 
+    # Each group of the alternation corresponds to the template at the same position of _TEMPLATES.
+    _REASON_RE = re.compile(r"(corresponde al valor total del servicio)|(intentos, no se cargó la factura)",
+                            re.IGNORECASE)
+    _TEMPLATES = (INCONSISTENCY_TOTAL_INVOICE, RETRY_FAILED)
+
     @classmethod
     def define_subject(cls, nro_factura: str, reason: str, fecha_factura: str) -> str:
         """Determines the appropriate subject line for a notification email based on the invoice number and reason.
@@ -71,13 +77,12 @@ class Subjects:
         Returns:
             str: The formatted subject line for the email.
         """
-        if 'corresponde al valor total del servicio' in reason.lower():
-            return cls.INCONSISTENCY_TOTAL_INVOICE.format(nro_factura=nro_factura, fecha_factura=fecha_factura)
-        if 'intentos, no se cargó la factura' in reason.lower():
-            return cls.RETRY_FAILED.format(nro_factura=nro_factura)
+        if match := cls._REASON_RE.search(reason):
+            template = cls._TEMPLATES[match.lastindex - 1]
+            return template.format(nro_factura=nro_factura, fecha_correo_recibido=fecha_factura)
         return cls.BASIC.format(nro_factura=nro_factura)
 
 
 class Emails:
-    LOGIFARMA_ADMIN = config('LOGIFARMA_ADMIN')
-    LOGIFARMA_DEV = config('LOGIFARMA_DEV')
+    LOGIFARMA_ADMIN = SETTINGS.LOGIFARMA_ADMIN
+    LOGIFARMA_DEV = SETTINGS.LOGIFARMA_DEV
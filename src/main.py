@@ -1,27 +1,47 @@
 """Main module for the RPA Facturas project."""
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
 from http.client import HTTPException
 from pathlib import Path
 from sqlite3 import IntegrityError
+from typing import Any
 
-from apscheduler.schedulers.blocking import BlockingScheduler
 from googleapiclient.errors import HttpError
-from pytz import timezone
 
-from src.config import log
-from src.constants import Reasons, Emails, Subjects, EMAILS_PER_EXECUTION
+from src.config import CONFIG, log
+from src.constants import Reasons, Emails, Subjects, EMAILS_PER_EXECUTION, MAX_WORKERS, FACTURAS_TMP, \
+    FACTURAS_PDF
 from src.decorators import production_only
 from src.models.general import Run, Record
 from src.models.google import EmailMessage
 from src.models.mutualser import FindLoadResponse
-from src.resources.datetimes import colombia_now, diff_dates
+from src.resources.datetimes import colombia_now, diff_dates, in_business_hours, next_business_start, BOGOTA_TZ
 from src.resources.exceptions import FacturaCargadaSinExito, DuplicatedRow
 from src.resources.files import File
 from src.services.drive import GoogleDrive, GoogleDriveLogistica
 from src.services.gmail import GmailAPIReader
 from src.services.mutualser import MutualSerAPIClient
-from src.services.sheets import GSpreadSheets
-from src.services.supbase import Supabase
+
+# They live for the whole process so the services (and their sessions/tokens) built by each
+# thread are reused by the following scheduled runs instead of being rebuilt on every run.
+_services = threading.local()
+_shared_services: dict[str, Any] = {}
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='factura')
+_downloads_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='adjunto')
+_drive_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='drive')
+# Ids of the e-mails whose invoice was uploaded by this process. Gmail's search may still list them
+# as unread for a while after being marked as read, so they are skipped before requesting their details.
+_processed_ids: set[str] = set()
+# Only one report is written to Google Sheets at a time, even if the next run finishes before the previous report.
+_sheets_semaphore = threading.BoundedSemaphore(1)
+# Minutes between runs of the scheduler: the shortest after a run that found e-mails,
+# doubled after every run that found none, up to the longest.
+JOB_ID = 'invoice_processing_job'
+POLL_MIN_MINUTES = 5
+POLL_MAX_MINUTES = 60
+_poll = {'minutes': POLL_MIN_MINUTES}
+_START_BANNER = 10 * '⬇️'
+_END_BANNER = 7 * '⬆️'
 
 
 class Process:
@@ -29,39 +49,119 @@ class Process:
     Orchestrates the entire process of reading invoices from Gmail, uploading them to the Mutualser API,
     and logging the results.
     """
+    # Folders with a fixed id, any other folder name is resolved on Logistica's Drive.
+    _FOLDER_IDS = {'TMP': FACTURAS_TMP, 'PROCESADOS': FACTURAS_PDF}
 
     def __init__(self):
         """
         Initializes the services required for the process and a Run object to track the execution.
         """
         self.run = Run()
-        self.gmail = GmailAPIReader()
-        self.drive = GoogleDrive()
-        self.drive_logistica = GoogleDriveLogistica()
-        self.gs = GSpreadSheets()
-        self.mutualser_client = MutualSerAPIClient()
-        self.bd = Supabase()
+        self.bd = CONFIG.objects
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _thread_service(name: str, factory):
+        """
+        Returns the instance of a service bound to the current thread, creating it on first use.
+
+        The Google API clients (httplib2) and the Mutualser session are not thread-safe,
+        so every worker of the pool works with its own instances.
+        """
+        if (service := getattr(_services, name, None)) is None:
+            service = factory()
+            setattr(_services, name, service)
+        return service
+
+    @property
+    def gs(self) -> 'GSpreadSheets':
+        """
+        Google Sheets client, only imported and built when the first report is registered.
+        It is shared by every run, the reports are written one at a time (see register_report).
+        """
+        if (gs := _shared_services.get('gs')) is None:
+            from src.services.sheets import GSpreadSheets
+            gs = _shared_services['gs'] = GSpreadSheets()
+        return gs
+
+    @property
+    def gmail(self) -> GmailAPIReader:
+        return self._thread_service('gmail', GmailAPIReader)
+
+    @property
+    def drive(self) -> GoogleDrive:
+        return self._thread_service('drive', GoogleDrive)
+
+    @property
+    def drive_logistica(self) -> GoogleDriveLogistica:
+        return self._thread_service('drive_logistica', GoogleDriveLogistica)
+
+    @property
+    def mutualser_client(self) -> MutualSerAPIClient:
+        return self._thread_service('mutualser_client', MutualSerAPIClient)
 
     def get_emails(self):
         """
         A generator that fetches unread emails from the inbox, downloads their attachments,
         and yields EmailMessage objects for further processing.
+
+        The details of the emails are fetched with batch requests and the attachments are downloaded
+        concurrently, the emails are yielded as soon as their attachment has been downloaded.
+        At most twice the pool size of downloads are outstanding, a new one is submitted as each one
+        completes. If the generator is closed early, the attachments that were not yielded are deleted.
         """
         messages = self.gmail.read_inbox(EMAILS_PER_EXECUTION)
+        to_process = []
         for idx, message in enumerate(messages, 1):
             # log.info(f"{idx}. INICIANDO Leyendo e-mail y descargando adjunto")
+            if message.id in _processed_ids:
+                log.info("%d. %s Procesado anteriormente", idx, message.id)
+                continue
             try:
                 record = Record(email=message)
                 # record.save()
             except DuplicatedRow:
-                log.info(f"{idx}. {message.id} Procesado anteriormente")
+                log.info("%d. %s Procesado anteriormente", idx, message.id)
                 continue
-            self.gmail.fetch_email_details(message)
-            log.info(f"{10 * '⬇️'} INICIO FACTURA {message.nro_factura} {10 * '⬇️'}")
-            self.run.record[message.nro_factura] = record
-            self.gmail.download_attachment(message)
-            yield idx, message
-            log.info(f"{7 * '⬆️'}  FIN FACTURA {message.nro_factura} del {message.dt_factura_str} {7 * '⬆️'}\n")
+            to_process.append((idx, message, record))
+
+        self.gmail.fetch_many_details([message for _, message, _ in to_process])
+
+        queued = iter(to_process)
+        downloads: dict[Future, tuple[int, EmailMessage]] = {}
+
+        def submit_next():
+            """Starts the download of the next email, if any."""
+            if (item := next(queued, None)) is None:
+                return
+            idx, message, record = item
+            log.info("%s INICIO FACTURA %s %s", _START_BANNER, message.nro_factura, _START_BANNER)
+            with self._lock:
+                self.run.record[message.nro_factura] = record
+            downloads[_downloads_pool.submit(self.download_attachment, message)] = idx, message
+
+        for _ in range(2 * MAX_WORKERS):
+            submit_next()
+        try:
+            while downloads:
+                done, _ = wait(downloads, return_when=FIRST_COMPLETED)
+                for future in done:
+                    idx, message = downloads.pop(future)
+                    submit_next()
+                    if exc := future.exception():
+                        log.error("%d. %s No fue posible descargar el adjunto: %r", idx, message.nro_factura, exc)
+                        continue
+                    yield idx, message
+        finally:
+            # Only reached with downloads left when the consumer stopped (e.g. start() aborted)
+            for future, (_, message) in downloads.items():
+                future.cancel()
+                wait([future])
+                message.delete_files()
+
+    def download_attachment(self, message: EmailMessage):
+        """Downloads the attachment of the email with the Gmail client of the current thread."""
+        return self.gmail.download_attachment(message)
 
     def send_invoice_to_mutual_ser(self, zip_file: Path, nro_factura: str):
         """
@@ -75,11 +175,13 @@ class Process:
             FacturaCargadaSinExito: If the upload to the Mutualser API fails.
         """
         response: FindLoadResponse = self.mutualser_client.upload_file(zip_file)
-        self.run.record[nro_factura].response_mutualser = response
+        record = self.run.record[nro_factura]
+        record.response_mutualser = response
+        record.touch()
         if not response.cargado_exitoso:
             raise FacturaCargadaSinExito(response.unico_archivo.motivo_error)
 
-    def process_xmls_and_pdf(self, message: EmailMessage):
+    def process_xmls_and_pdf(self, message: EmailMessage) -> list[Future]:
         """Perform the next actions:
         1. Upload .zip to temp folder on Google Drive.
         2. Unzip files resulting a .pdf and a .xml files.
@@ -88,52 +190,96 @@ class Process:
         5. Create folder on Google Drive if it doesn't exist.
         6. Upload .pdf on "Procesados" folder.
         7. Upload .xml on folder of the month based on invoice date.
+
+        Steps 6 and 7 don't affect the upload to Mutualser, so each one is handed to the drive pool
+        and their futures are returned, letting the invoice be sent while they run.
         """
+        zip_temp = xml_file = pdf_file = None
         try:
             zip_temp = self.upload_file_to_drive(message.attachment_path, folder='TMP')
             xml_file, pdf_file = self.unzip_files(message.attachment_path)
             message.dt_factura = File(xml_file).get_fecha_factura()
-            xml_file = xml_file.rename(xml_file.parent / f"{message.nro_factura}_{xml_file.stem}.xml")
-            pdf_file = pdf_file.rename(pdf_file.parent / f"{message.nro_factura}_{message.valor_factura or ""}.pdf")
+            xml_file = xml_file.rename(xml_file.with_name(f"{message.nro_factura}_{xml_file.stem}.xml"))
+            pdf_file = pdf_file.rename(pdf_file.with_name(message.pdf_name))
             if message.dt_factura.year < 2026:
                 xml_file = File(xml_file).update_invoice()
                 message.attachment_path = File.zip_files(xml_file, pdf_file, filename=message.attachment_path.stem)
             folder_name = self.drive.get_facturas_mes_name(message.received_at.date().month,
                                                            message.received_at.date().year)
-            self.upload_file_to_drive(pdf_file, folder='PROCESADOS')
-            self.upload_file_to_drive(xml_file, folder=folder_name)
         except Exception as e:
-            import traceback;
-            traceback.print_exc()
-            log.error(str(e))
+            log.exception(str(e))
+            for file in (xml_file, pdf_file):
+                if file:
+                    file.unlink(missing_ok=True)
+            return []
+        else:
+            return [_drive_pool.submit(self.upload_and_remove, pdf_file, 'PROCESADOS'),
+                    _drive_pool.submit(self.upload_and_remove, xml_file, folder_name)]
         finally:
-            xml_file.unlink(missing_ok=True)
-            pdf_file.unlink(missing_ok=True)
             # message.attachment_path.unlink(missing_ok=True)
-            self.drive.delete_file(zip_temp)
+            if zip_temp:
+                self.drive.delete_file(zip_temp)
+
+    def upload_and_remove(self, file: Path, folder: str):
+        """Uploads a file to Google Drive with the client of the current thread and removes it from the local env."""
+        try:
+            self.upload_file_to_drive(file, folder=folder)
+        except Exception as e:
+            log.exception(str(e))
+        finally:
+            file.unlink(missing_ok=True)
 
     def start(self):
         """
-        Main workflow that iterates through emails from the inbox, attempts to upload the invoice for each,
-        and handles the outcome. Successful uploads are finalized, and failures are logged.
+        Main workflow that iterates through emails from the inbox and hands every invoice to a pool of
+        workers, so the network round trips of several invoices (Drive, Mutualser, Gmail) overlap.
+        The invoices handed to the pool are bounded to twice its size, and so are the attachments being
+        downloaded ahead of them (see get_emails).
         """
-        for idx, message in self.get_emails():
-            try:
-                log.info(f"{idx}. {message.nro_factura} recibida el {message.fecha_correo_recibido}"
-                         f" XML y PDF siendo cargados al drive")
-                self.process_xmls_and_pdf(message)
-                # log.info(f"\t{idx}. {message.nro_factura} {message.dt_factura_str} Enviando a Mutualser")
-                self.send_invoice_to_mutual_ser(message.attachment_path, message.nro_factura)
-            except FileNotFoundError:
-                self.post_exception(message, Reasons.FILE_NOT_FOUND_MUTUAL_SER)
-            except FacturaCargadaSinExito as e:
-                self.post_exception(message, str(e))
-            except Exception as e:
-                self.post_exception(message, f"{str(type(e))}: {str(e)}")
-            else:
-                self.finish(idx, message)
-            finally:
-                message.delete_files()
+        pending: set[Future] = set()
+        try:
+            for idx, message in self.get_emails():
+                pending.add(_pool.submit(self.process_invoice, idx, message))
+                if len(pending) >= 2 * MAX_WORKERS:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._check_results(done)
+        finally:
+            self._check_results(wait(pending).done)
+
+    @staticmethod
+    def _check_results(futures: set[Future]):
+        """Logs any unexpected exception raised by a worker."""
+        for future in futures:
+            if exc := future.exception():
+                log.error("Error inesperado procesando factura: %r", exc)
+
+    def process_invoice(self, idx: int, message: EmailMessage):
+        """
+        Attempts to upload the invoice of one email and handles the outcome.
+        Successful uploads are finalized, and failures are logged.
+        The upload of the .xml and .pdf to Google Drive runs while the invoice is sent to Mutualser,
+        and is awaited before closing the invoice.
+        """
+        drive_uploads = []
+        try:
+            log.info("%d. %s recibida el %s XML y PDF siendo cargados al drive",
+                     idx, message.nro_factura, message.fecha_correo_recibido)
+            drive_uploads = self.process_xmls_and_pdf(message)
+            # log.info(f"\t{idx}. {message.nro_factura} {message.dt_factura_str} Enviando a Mutualser")
+            self.send_invoice_to_mutual_ser(message.attachment_path, message.nro_factura)
+        except FileNotFoundError:
+            self.post_exception(message, Reasons.FILE_NOT_FOUND_MUTUAL_SER)
+        except FacturaCargadaSinExito as e:
+            self.post_exception(message, str(e))
+        except Exception as e:
+            self.post_exception(message, f"{str(type(e))}: {str(e)}")
+        else:
+            self.finish(idx, message)
+        finally:
+            wait(drive_uploads)
+            message.delete_files()
+            log.info("%s  FIN FACTURA %s del %s %s\n", _END_BANNER, message.nro_factura, message.dt_factura_str,
+                     _END_BANNER)
 
     def finish(self, idx: int, message: EmailMessage):
         """
@@ -143,7 +289,10 @@ class Process:
         3. Set the status for report purposes.
         """
         self.gmail.mark_as_read(message.id)
-        self.run.record[message.nro_factura].status = Reasons.UPLOADED_MUTUAL_SER
+        _processed_ids.add(message.id)
+        record = self.run.record[message.nro_factura]
+        record.status = Reasons.UPLOADED_MUTUAL_SER
+        record.touch()
         # self.run.record[message.nro_factura].update(nro_factura=message.nro_factura)  # Supabase stuff
         # log.info(f"{idx}. {message.nro_factura} {message.dt_factura_str} FINALIZADO")
 
@@ -153,8 +302,10 @@ class Process:
         :param message: EmailMessage object containing the invoice information.
         :param reason: Specific reason of failure.
         """
-        self.run.record[message.nro_factura].status = Reasons.INVOCE_UPLOADED_WITH_ERROR
-        self.run.record[message.nro_factura].errors.append(reason)
+        record = self.run.record[message.nro_factura]
+        record.status = Reasons.INVOCE_UPLOADED_WITH_ERROR
+        record.errors.append(reason)
+        record.touch()
         # self.run.record[message.nro_factura].remove() # Supabase stuff
         self.send_mail(message, reason)
 
@@ -170,9 +321,9 @@ class Process:
                                              'fecha_factura': message.dt_factura_str},
                                   attachment_file=message.attachment_path)
         except HttpError as e:
-            log.warning(f"{message.nro_factura} No fue posible enviar correo {subject!r} por error: {str(e)}")
+            log.warning("%s No fue posible enviar correo %r por error: %s", message.nro_factura, subject, e)
         else:
-            log.info(f"{message.nro_factura} E-mail enviado notificando incosistencia: {reason}")
+            log.info("%s E-mail enviado notificando incosistencia: %s", message.nro_factura, reason)
 
     @production_only
     def register_in_sheets(self):
@@ -190,66 +341,93 @@ class Process:
 
     def upload_file_to_drive(self, file: Path, folder: str):
         """Upload zip file to Google Drive"""
-        match folder:
-            case 'TMP':
-                file_id = self.drive.upload_file(file, self.drive.temp)
-            case 'PROCESADOS':
-                file_id = self.drive.upload_file(file, self.drive.facturas_pdf)
-            case _:
-                folder_id = self.drive_logistica.create_or_get_folder_id(folder)
-                file_id = self.drive.upload_file(file, folder_id)
-        return file_id.get('id')
-
-
-def run_process():
+        folder_id = self._FOLDER_IDS.get(folder) or self.drive_logistica.create_or_get_folder_id(folder)
+        return self.drive.upload_file(file, folder_id).get('id')
+
+
+def run_process() -> int:
     """
     Main execution function that orchestrates the entire process.
     This is the function that will be scheduled by Rocketry.
+
+    Returns the amount of e-mails processed.
     """
     moment = colombia_now()
     # Executed from Monday to Saturday, from 6:00:00 up to 20:59:59
+    if not in_business_hours(moment):
+        log.info(f"SCHEDULER: Procesamiento omitido, {moment:%A %T} está fuera del horario.")
+        return 0
     log.info("SCHEDULER: Iniciando nuevo procesamiento de facturas.")
     p = Process()
     try:
         p.start()
-    except Exception as e:
-        import traceback;
-        traceback.print_exc()
-
-    try:
-        p.register_in_sheets()
-    except Exception as e:
-        import traceback
+    except Exception:
+        log.exception("Error procesando las facturas")
 
-        traceback.print_exc()
+    # A run without e-mails has nothing to report
+    if p.run.record:
+        threading.Thread(target=register_report, args=(p,), name='reporte').start()
 
-    ordered_records = p.run.order_by_fecha_factura()
-    if ordered_records:
-        last_record = ordered_records[0]
-        first_record = ordered_records[-1]
+    if first_and_last := p.run.first_and_last_by_received():
+        first_record, last_record = first_and_last
         log.info(f"REPORT: Primera Factura fue {first_record[0]} del {first_record[1].email.momento_factura}.")
         log.info(f"REPORT: Última Factura fue {last_record[0]} del {last_record[1].email.momento_factura}.")
     log.info(f"REPORT: Comenzó a las {moment:%T} y le tomó {diff_dates(moment, colombia_now())} procesar"
-             f" {len(ordered_records)} correos.")
+             f" {len(p.run.record)} correos.")
+    return len(p.run.record)
+
+
+def scheduled_run(scheduler):
+    """
+    Job of the scheduler, runs the process and adapts the moment of the next run.
+
+    While e-mails keep arriving it runs every POLL_MIN_MINUTES, when the inbox is empty the
+    interval is doubled up to POLL_MAX_MINUTES. Out of the process window it sleeps until it opens.
+    """
+    processed = run_process()
+    now = colombia_now()
+    if in_business_hours(now):
+        _poll['minutes'] = POLL_MIN_MINUTES if processed else min(2 * _poll['minutes'], POLL_MAX_MINUTES)
+        start_date = None
+    else:
+        _poll['minutes'] = POLL_MIN_MINUTES
+        start_date = next_business_start(now)
+    scheduler.reschedule_job(JOB_ID, trigger='interval', minutes=_poll['minutes'], start_date=start_date)
+    log.info("SCHEDULER: Próximo procesamiento a las %s.", f"{scheduler.get_job(JOB_ID).next_run_time:%A %T}")
+
+
+def register_report(p: Process):
+    """Writes the report of a run in Google Sheets, it runs in its own thread so it doesn't delay the scheduler."""
+    with _sheets_semaphore:
+        try:
+            p.register_in_sheets()
+        except Exception:
+            log.exception("Error registrando el reporte en Google Sheets")
+
+
+def warm_up_imports():
+    """Imports the modules that are only needed for the report, so it doesn't pay for them at the end of the run."""
+    import pandas  # noqa: F401
+    import src.services.sheets  # noqa: F401
 
 
 if __name__ == '__main__':
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    threading.Thread(target=warm_up_imports, name='warm-up', daemon=True).start()
     # for i, (nro, record) in enumerate(p.run.record.items(), 1):
     #     print(f"{i}. {nro}: {record.email.subject}")
     # run_process()
-    scheduler = BlockingScheduler(timezone=timezone("America/Bogota"))
+    scheduler = BlockingScheduler(timezone=BOGOTA_TZ)
+    # Runs once immediately, then every run reschedules the next one (see scheduled_run)
     scheduler.add_job(
-        run_process,
-        'cron',
-        day_of_week='mon-sat',   # Monday to Saturday
-        hour='6-20',             # 6:00 to 20:00 (every hour on the hour)
-        minute=0,
-        id='invoice_processing_job',
+        scheduled_run,
+        'interval',
+        args=(scheduler,),
+        minutes=POLL_MIN_MINUTES,
+        next_run_time=colombia_now(),
+        id=JOB_ID,
     )
-    # Optional: run once immediately if within allowed window, then follow schedule
-    now = datetime.now(tz=timezone("America/Bogota"))
-    if now.weekday() < 6 and 6 <= now.hour <= 20:  # Mon-Sat, 6–20
-        run_process()
     try:
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
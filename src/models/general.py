@@ -1,11 +1,9 @@
-from collections import defaultdict
 from datetime import datetime
 from sqlite3 import IntegrityError
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
-from pandas import DataFrame
 from postgrest import APIError
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field
 
 from src.config import CONFIG
 from src.constants import TABLE_FAC_PROCS
@@ -15,6 +13,9 @@ from src.resources.datetimes import convert_utc_to_utc_minus_5
 from src.resources.exceptions import DuplicatedRow
 from src.services.supbase import CODE_ERROR_DUPLICATED_KEY
 
+if TYPE_CHECKING:
+    from pandas import DataFrame
+
 
 class Record(BaseModel):
     started_at: datetime = Field(default_factory=datetime.now)
@@ -24,36 +25,30 @@ class Record(BaseModel):
     errors: list[Exception] = []
     finished_at: datetime = Field(default_factory=datetime.now)
 
-    # Internal attribute to track changes
-    _initialized: bool = PrivateAttr(default=False)
-
-    def __init__(self, **data):
-        super().__init__(**data)
-        object.__setattr__(self, "_initialized", True)
-
-    def __setattr__(self, name, value):
-        if getattr(self, "_initialized", False) and name not in {"finished_at", "_initialized"}:
-            super().__setattr__("finished_at", datetime.now())
-        super().__setattr__(name, value)
+    def touch(self):
+        """Sets the moment of the last change of the record, to be called after updating it."""
+        self.finished_at = datetime.now()
 
     @property
     def finished_at_utc(self):
         return convert_utc_to_utc_minus_5(self.finished_at)
 
-    def to_dataframe(self) -> DataFrame:
-        """Converts the record to a pandas DataFrame."""
-        return DataFrame({
-            'Factura': [self.email.nro_factura],
-            'Fecha Factura': [self.email.dt_factura_str],
-            'ID de cargue': [self.response_mutualser.cargue_id if self.response_mutualser else ""],
-            'Total': [self.email.valor_factura],
-            'Status': [self.status],
-            'Errores': [", ".join(map(str, self.errors))],
-            'Día': [self.finished_at_utc.strftime('%d')],
-            'Mes': [self.finished_at_utc.strftime('%m')],
-            'Año': [self.finished_at_utc.year],
-            'Momento': [f"{self.finished_at_utc:%T}"]
-        })
+    def as_row(self) -> dict:
+        """Returns the record as a dict of column name to value, as it is reported."""
+        finished_at_utc = self.finished_at_utc
+        dia, mes, momento = f"{finished_at_utc:%d %m %T}".split()
+        return {
+            'Factura': self.email.nro_factura,
+            'Fecha Factura': self.email.dt_factura_str,
+            'ID de cargue': self.response_mutualser.cargue_id if self.response_mutualser else "",
+            'Total': self.email.valor_factura,
+            'Status': self.status,
+            'Errores': ", ".join(map(str, self.errors)),
+            'Día': dia,
+            'Mes': mes,
+            'Año': finished_at_utc.year,
+            'Momento': momento
+        }
 
     class Config:
         arbitrary_types_allowed = True
@@ -66,7 +61,7 @@ class Record(BaseModel):
 
     @property
     def nro_factura(self):
-        return self.email.message.nro_factura
+        return self.email.nro_factura
 
     @property
     def convenio(self):
@@ -113,6 +108,11 @@ class Record(BaseModel):
                 raise DuplicatedRow(getattr(e, 'details', ""))
             raise
 
+    @classmethod
+    def save_many(cls, records: list['Record']) -> list:
+        """Saves several records to the database in batches, the duplicated ones are left out."""
+        return CONFIG.objects.insert_many(cls.RowModel.table_name, rows=[record.row for record in records])
+
     def update(self, **kwargs):
         """Updates the record in the database."""
         try:
@@ -137,8 +137,8 @@ class Record(BaseModel):
     def has_been_processed(self):
         """Determines if the record exists in BD."""
         columns = ", ".join(("created_at", "nro_factura", "convenio", "email_id"))
-        filter_eq = [("email_id", self.email.id), ("convenio", self.convenio)]
-        res = self.database.fetch(table=self.Row.table_name, columns=columns, filter_eq=filter_eq)
+        filter_eq = {"email_id": self.email.id, "convenio": self.convenio}
+        res = self.database.fetch(self.RowModel.table_name, columns=columns, filter_eq=filter_eq)
         return bool(res.count)
 
 
@@ -146,14 +146,19 @@ class Run(BaseModel):
     date: datetime = Field(default_factory=datetime.now)
     record: dict[str, Record] = Field(default_factory=dict)
 
-    # Optional: convert to defaultdict after model creation
-    def model_post_init(self, __context) -> None:
-        self.record = defaultdict(Record, self.record)
+    def make_df(self) -> 'DataFrame':
+        """Generates a DataFrame from all the records, the last one processed first."""
+        from pandas import DataFrame
+        rows = [record.as_row() for record in reversed(self.record.values())]
+        return DataFrame({column: [row[column] for row in rows] for column in rows[0]} if rows else None)
+
+    def first_and_last_by_received(self) -> tuple[tuple[str, Record], tuple[str, Record]] | None:
+        """Returns the (nro_factura, record) items of the first and the last e-mail received, None if there are no records."""
+        if not self.record:
+            return None
+        items = self.record.items()
+        return min(items, key=_received_at), max(items, key=_received_at)
 
-    def make_df(self) -> DataFrame:
-        """Generates a DataFrame from all the records."""
-        return DataFrame()._append([record.to_dataframe() for record in self.record.values()][::-1], ignore_index=True)
 
-    def order_by_fecha_factura(self) -> list:
-        """Create a list based on record's information."""
-        return sorted(self.record.items(), key=lambda item: item[1].email.received_at, reverse=True)
+def _received_at(item: tuple[str, Record]) -> datetime:
+    return item[1].email.received_at
@@ -1,15 +1,26 @@
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
 from typing import Optional
+import re
+import shutil
 import zipfile
 
-from bs4 import BeautifulSoup
+from lxml import etree, html
+from lxml.html import HtmlElement
 from pydantic import BaseModel, Field
 
 from src.config import CONFIG
 from src.constants import LOGI_NIT
 from src.resources.datetimes import convert_utc_to_utc_minus_5
-from src.resources.files import delete_file_if_exists
+from src.resources.files import COPY_CHUNK_SIZE, delete_file_if_exists
+
+# Third cell of the row whose label is "Total:", it holds the value of the invoice.
+# The regex reads it straight from the templated body, the XPath is used when the layout differs.
+# Like the XPath, the regex only looks at the two cells right after the one holding the label.
+_TOTAL_RE = re.compile(r'<b[^>]*>\s*Total:\s*</b>(?:(?!</td>).)*</td>\s*<td[^>]*>[^<]*</td>\s*<td[^>]*>([^<]+)</td>',
+                       re.DOTALL | re.IGNORECASE)
+_TOTAL_XPATH = etree.XPath('//b[normalize-space()="Total:"]/ancestor::td[1]/following-sibling::td[2]')
 
 
 class EmailMessage(BaseModel):
@@ -21,6 +32,7 @@ class EmailMessage(BaseModel):
     dt_factura: Optional[datetime] = None
     body_html: Optional[str] = None
     recipient: Optional[str] = None
+    attachment_id: Optional[str] = None
     attachment_path: Optional[Path] = None
     pdf_path: Optional[Path] = None
 
@@ -28,26 +40,27 @@ class EmailMessage(BaseModel):
         arbitrary_types_allowed = True
         orm_mode = True
 
-    @property
-    def soup(self) -> Optional[BeautifulSoup]:
-        """Returns a BeautifulSoup object of the email's HTML body."""
+    @cached_property
+    def tree(self) -> Optional[HtmlElement]:
+        """Returns the lxml tree of the email's HTML body, parsed only once."""
         if self.body_html:
-            return BeautifulSoup(self.body_html, "lxml")
+            return html.fromstring(self.body_html)
         return None
 
-    @property
+    @cached_property
     def valor_factura(self) -> int | None:
         """Extracts the value of the invoice from the email's HTML body"""
-        if self.soup:
-            b_tag = self.soup.find('b', string='Total:')
-            td_with_value = b_tag.find_parent('td').find_next_sibling('td').find_next_sibling('td')
-            raw_text = td_with_value.get_text(strip=True).replace(',', '')
-            return int(float(raw_text))
+        if self.body_html:
+            if match := _TOTAL_RE.search(self.body_html):
+                raw_text = match.group(1)
+            else:
+                raw_text = _TOTAL_XPATH(self.tree)[0].text_content()
+            return int(float(raw_text.strip().replace(',', '')))
         return None
 
-    @property
+    @cached_property
     def nro_factura(self) -> Optional[str]:
-        """Extracts the invoice number from the email subject."""
+        """Extracts the invoice number from the email subject, once its details have been fetched."""
         if self.subject:
             try:
                 return self.subject.split(";")[2]
@@ -55,7 +68,7 @@ class EmailMessage(BaseModel):
                 return None
         return None
 
-    @property
+    @cached_property
     def fecha_correo_recibido(self) -> Optional[str]:
         """Convert the date to a UTC-5 date and return it as string"""
         if self.received_at:
@@ -77,28 +90,30 @@ class EmailMessage(BaseModel):
             return f"{convert_utc_to_utc_minus_5(self.received_at):%d/%m/%Y %H:%M:%S}"
         return ""
 
-    @property
+    @cached_property
     def zip_name(self) -> Optional[str]:
         """Constructs the zip filename from the invoice number and customer NIT."""
         if self.nro_factura:
             return f"{self.nro_factura}_{LOGI_NIT}.zip"
         return None
 
+    @cached_property
+    def pdf_name(self) -> str:
+        """Name of the invoice's PDF, computed once (after the email details have been fetched)."""
+        return f"{self.nro_factura}_{self.valor_factura or ''}.pdf"
+
     def extract_and_rename_pdf(self) -> Optional[Path]:
         """Extracts a PDF file from a ZIP attachment, renames it, and saves the new path."""
         if self.attachment_path and self.attachment_path.exists() and self.nro_factura and self.valor_factura:
             with zipfile.ZipFile(self.attachment_path, 'r') as zip_ref:
                 for file_info in zip_ref.infolist():
                     if file_info.filename.lower().endswith('.pdf'):
-                        pdf_content = zip_ref.read(file_info.filename)
-                        new_filename = f"{self.nro_factura}_{self.valor_factura}.pdf"
-                        self.pdf_path = CONFIG.DIRECTORIES.TEMP / new_filename
-                        with open(self.pdf_path, 'wb') as pdf_file:
-                            pdf_file.write(pdf_content)
+                        self.pdf_path = CONFIG.DIRECTORIES.TEMP / self.pdf_name
+                        with zip_ref.open(file_info) as src, open(self.pdf_path, 'wb') as pdf_file:
+                            shutil.copyfileobj(src, pdf_file, length=COPY_CHUNK_SIZE)
                         return self.pdf_path
         return None
 
     def delete_files(self):
         """Deletes the attachment and PDF files associated from the local env."""
-        for file in (self.attachment_path, self.pdf_path):
-            delete_file_if_exists(file)
+        delete_file_if_exists(self.attachment_path, self.pdf_path)
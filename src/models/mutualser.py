@@ -1,9 +1,18 @@
-from pathlib import Path
+import re
 from typing import List, Optional
 from pydantic import BaseModel, HttpUrl, RootModel
 from datetime import datetime
 from uuid import UUID
 
+# Words of a description that contain a path separator (POSIX or Windows).
+_PATH_RE = re.compile(r'[^ ]*[\\/][^ ]*')
+
+
+def _file_name(match: re.Match) -> str:
+    """Returns the last component of the path matched, as `Path.name` does."""
+    path = match.group(0).rstrip('/\\')
+    return path[max(path.rfind('/'), path.rfind('\\')) + 1:]
+
 
 class Mensaje(BaseModel):
     codigo: str
@@ -22,9 +31,7 @@ class Mensaje(BaseModel):
         """
         # The original `desc` property was incomplete. This implementation
         # provides a clean, readable version of the description string.
-        words = self.descripcion.split(' ')
-        new_words = [Path(word).name if '/' in word or '\\' in word else word for word in words]
-        return ' '.join(new_words)
+        return _PATH_RE.sub(_file_name, self.descripcion)
 
 
 class Archivo(BaseModel):
@@ -104,6 +111,11 @@ class FindLoadResponse(BaseModel):
             return self.primer_archivo.cargado
         return False
 
+    @property
+    def terminal_error(self) -> bool:
+        """Determines if the API already rejected the file, so it won't be loaded no matter how long it is polled."""
+        return bool(self.archivos and self.primer_archivo.error)
+
     @property
     def unico_archivo(self):
         return self.primer_archivo
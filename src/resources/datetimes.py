@@ -1,5 +1,11 @@
 from datetime import datetime, timezone, timedelta
 from typing import LiteralString
+from zoneinfo import ZoneInfo
+
+BOGOTA_TZ = ZoneInfo("America/Bogota")
+UTC_MINUS_5 = timezone(timedelta(hours=-5))
+# Units in which diff_dates describes a difference, with their size in seconds.
+_TIME_UNITS = (("hora", 3600), ("minuto", 60), ("segundo", 1))
 
 
 def convert_utc_to_utc_minus_5(dt: datetime) -> datetime:
@@ -12,14 +18,26 @@ def convert_utc_to_utc_minus_5(dt: datetime) -> datetime:
     Returns:
         datetime: Converted datetime object in UTC-5
     """
-    from datetime import timezone
-    utc_minus_5 = timezone(timedelta(hours=-5))
-    return dt.astimezone(utc_minus_5)
+    return dt.astimezone(UTC_MINUS_5)
 
 
 def colombia_now() -> datetime:
-    from pytz import timezone
-    return datetime.now(tz=timezone("America/Bogota"))
+    return datetime.now(tz=BOGOTA_TZ)
+
+
+def in_business_hours(moment: datetime) -> bool:
+    """Determines if the moment is within the window the process runs: Monday to Saturday, from 6:00:00 up to 20:59:59."""
+    return moment.isoweekday() != 7 and 6 <= moment.hour <= 20
+
+
+def next_business_start(moment: datetime) -> datetime:
+    """Returns the next moment the process window opens: 6:00:00 of the next day from Monday to Saturday."""
+    start = moment.replace(hour=6, minute=0, second=0, microsecond=0)
+    if moment >= start:
+        start += timedelta(days=1)
+    if start.isoweekday() == 7:
+        start += timedelta(days=1)
+    return start
 
 
 def diff_dates(dt_older: datetime, dt_newer: datetime) -> LiteralString:
@@ -34,25 +52,13 @@ def diff_dates(dt_older: datetime, dt_newer: datetime) -> LiteralString:
     Returns:
         LiteralString: A string representing the time difference in a human-readable format.
     """
-    time_difference = dt_older - dt_newer
-    seconds_difference = abs(time_difference.total_seconds())
-
-    def format_time_diff(diff_seconds):
-        minutes, seconds = divmod(int(diff_seconds), 60)
-        hours, minutes = divmod(minutes, 60)
-        parts = []
-
-        if hours > 0:
-            parts.append(f"{hours} hora{'s' if hours != 1 else ''}")
-        if minutes > 0:
-            parts.append(f"{minutes} minuto{'s' if minutes != 1 else ''}")
-        if seconds > 0 or not parts:
-            parts.append(f"{seconds} segundo{'s' if seconds != 1 else ''}")
-
-        return ", ".join(parts)
-
-    return format_time_diff(seconds_difference)
-
+    seconds = int(abs((dt_older - dt_newer).total_seconds()))
+    parts = []
+    for name, size in _TIME_UNITS:
+        amount, seconds = divmod(seconds, size)
+        if amount:
+            parts.append(f"{amount} {name}{'s' if amount != 1 else ''}")
+    return ", ".join(parts) or "0 segundos"
 
 if __name__ == '__main__':
     dt_older = datetime.now() - timedelta(minutes=22)
@@ -1,6 +1,13 @@
 from datetime import datetime, date
+from functools import lru_cache
+import glob
 import mimetypes
+import os
 import re
+import shutil
+import struct
+import subprocess
+import zlib
 
 from src.config import log
 
@@ -10,37 +17,105 @@ from pathlib import Path
 
 from src.resources.parser import XMLHealthInvoiceProcessor
 
+# Size of the chunks in which the files are copied out of a .zip, instead of reading them whole in memory.
+COPY_CHUNK_SIZE = 1024 * 1024
+# The system's unzip is much faster than zipfile looking up entries of big archives.
+UNZIP = shutil.which('unzip')
+UNZIP_MIN_ENTRIES = 50
+# Uncompressed entries are copied without going through user space where the OS supports it (Linux).
+COPY_FILE_RANGE = hasattr(os, 'copy_file_range')
+
+# Patterns of the invoice date in the .xml, the first one that matches is used.
+_FECHA_FACTURA_PATTERNS = (re.compile(r'FecFac: (\d{4}-\d{2}-\d{2})'),
+                           re.compile(r'UUID><cbc:IssueDate>(\d{4}-\d{2}-\d{2})<\/cbc:IssueDate>'))
+
 
 class File:
     def __init__(self, file_path: Path):
-        self.file_path = Path(file_path)
+        self.file_path = file_path if isinstance(file_path, Path) else Path(file_path)
 
     def unzip(self, extract_to=None):
-        """Unzip the zip_file and return a Path object of the xml."""
+        """Unzip the .xml and .pdf files of the zip_file and return a dict of extension to Path."""
         # If no path is provided, use the system's temp directory
-        if extract_to is None:
-            extract_to = Path(tempfile.gettempdir())
-        # Use zipfile as a context manager
+        extract_to = Path(tempfile.gettempdir()) if extract_to is None else Path(extract_to)
+        files = {}
         with zipfile.ZipFile(self.file_path, 'r') as archive:
-            # Find the first XML file in the list
-            filenames = [f for f in archive.namelist() if f.lower().endswith('.xml') or f.lower().endswith('.pdf')]
-
-            if not filenames:
-                raise ValueError("No file found in the ZIP archive.")
-
-            target_files = []
-            for filename in filenames:
-                # Extract only the XML file to the destination
-                archive.extract(filename, path=extract_to)
+            # Entry of each extension to be extracted, the last one of the archive as when all were extracted
+            entries = archive.infolist()
+            members = {}
+            for info in entries:
+                extension = info.filename.rpartition('.')[2].lower()
+                if extension in ('xml', 'pdf') and not info.is_dir():
+                    members[extension] = info
+
+            for extension, info in members.items():
+                files[extension] = extract_to / info.filename.rpartition('/')[2]
+            if UNZIP and len(entries) > UNZIP_MIN_ENTRIES and self._system_unzip(members.values(), extract_to):
+                return files
+
+            for extension, info in members.items():
+                if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1 and COPY_FILE_RANGE:
+                    try:
+                        self._copy_stored(info, files[extension])
+                        continue
+                    except OSError as e:
+                        # e.g. EXDEV when the kernel can't copy between the filesystems involved
+                        log.warning(f"copy_file_range falló extrayendo {info.filename}, se usará zipfile: {e}")
+                with archive.open(info) as src, open(files[extension], 'wb') as dst:
+                    shutil.copyfileobj(src, dst, length=COPY_CHUNK_SIZE)
+
+        if not files:
+            raise ValueError("No file found in the ZIP archive.")
+        return files
+
+    def _copy_stored(self, info: zipfile.ZipInfo, destination: Path):
+        """
+        Copies an uncompressed entry from the archive to the destination inside the kernel, with copy_file_range.
 
-            # Construct the full absolute path
-            return {filename[-3:]: extract_to / Path(filename) for filename in filenames}
+        The checks zipfile does are kept: the signature of the local header and the CRC-32 of the data,
+        which is computed reading the copy back. BadZipFile is raised, and the copy removed, on a mismatch.
+        """
+        try:
+            with open(self.file_path, 'rb') as src, open(destination, 'wb+') as dst:
+                # The data starts after the local header, its name and extra field may differ from the central directory
+                src.seek(info.header_offset)
+                header = src.read(zipfile.sizeFileHeader)
+                if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+                    raise zipfile.BadZipFile(f"Bad local header of {info.filename!r} in {self.file_path.name}")
+                name_length, extra_length = struct.unpack('<HH', header[26:30])
+                offset = info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+                remaining = info.file_size
+                while remaining:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset)
+                    if not copied:
+                        raise zipfile.BadZipFile(f"Truncated entry {info.filename!r} in {self.file_path.name}")
+                    offset += copied
+                    remaining -= copied
+
+                dst.seek(0)
+                crc = 0
+                while chunk := dst.read(COPY_CHUNK_SIZE):
+                    crc = zlib.crc32(chunk, crc)
+                if crc != info.CRC:
+                    raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r} in {self.file_path.name}")
+        except zipfile.BadZipFile:
+            destination.unlink(missing_ok=True)
+            raise
+
+    def _system_unzip(self, members, extract_to) -> bool:
+        """Extracts the members with the system's unzip, flattened as File.unzip does. Returns if it succeeded."""
+        names = [glob.escape(info.filename) for info in members]
+        result = subprocess.run([UNZIP, '-qq', '-o', '-j', str(self.file_path), *names, '-d', str(extract_to)],
+                                capture_output=True)
+        if result.returncode:
+            log.warning(f"unzip falló extrayendo {self.file_path.name}, se usará zipfile: {result.stderr!r}")
+        return not result.returncode
 
     def get_fecha_factura(self) -> date | None:
         """Get the factura date from the .xml file."""
-        patterns = {r'FecFac: (\d{4}-\d{2}-\d{2})', r'UUID><cbc:IssueDate>(\d{4}-\d{2}-\d{2})<\/cbc:IssueDate>'}
-        for pattern in patterns:
-            if match := re.search(pattern, self.file_path.read_text(encoding='utf-8')):
+        content = self.file_path.read_text(encoding='utf-8')
+        for pattern in _FECHA_FACTURA_PATTERNS:
+            if match := pattern.search(content):
                 year, month, day = match.group(1).split('-')
                 return datetime(int(year), int(month), int(day)).date()
         return None
@@ -77,22 +152,23 @@ class File:
         return temp_zip_file
 
 
-def delete_file_if_exists(file_path: Path):
+def delete_file_if_exists(*file_paths: Path | None):
     """
-    Deletes a file if it exists, without raising an exception if the file doesn't exist.
+    Deletes files if they exist, without raising an exception if a file doesn't exist.
 
     Args:
-        file_path: The PosixPath object representing the file to delete.
+        file_paths: The PosixPath objects representing the files to delete, None values are skipped.
     """
-    try:
+    for file_path in file_paths:
         if not file_path:
-            return
-        file_path.unlink(missing_ok=True)
-    except OSError as e:
-        # Log the error if needed, but don't re-raise as per requirement
-        log.error(f"Error deleting file {file_path}: {e}")
-    except Exception as e:
-        log.error(f"Error unexpected deleting file {str(e)}")
+            continue
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Log the error if needed, but don't re-raise as per requirement
+            log.error(f"Error deleting file {file_path}: {e}")
 
 
 def extract_nro_factura_from_file(file_path: Path) -> str:
@@ -110,13 +186,21 @@ def extract_nro_factura_from_file(file_path: Path) -> str:
     if not file_path:
         return ""
 
-    if splitted_file_name := file_path.name.split('_'):
-        return splitted_file_name[0]
-    return file_path.name
+    return file_path.name.partition('_')[0]
+
+
+# Mime types of the files handled by the project, any other is guessed by mimetypes.
+_MIME_TYPES = {'.pdf': 'application/pdf', '.xml': 'application/xml', '.zip': 'application/zip'}
 
 
 def get_mime_type(path: Path) -> str | None:
-    mime_type, _ = mimetypes.guess_type(path.name)
+    suffix = path.suffix.lower()
+    return _MIME_TYPES.get(suffix) or _guess_mime_type(suffix)
+
+
+@lru_cache(maxsize=256)
+def _guess_mime_type(suffix: str) -> str | None:
+    mime_type, _ = mimetypes.guess_type(f"file{suffix}")
     return mime_type
 
 if __name__ == '__main__':
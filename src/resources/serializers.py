@@ -0,0 +1,47 @@
+import json
+
+from googleapiclient.model import JsonModel
+
+from src.config import log
+
+try:
+    import orjson
+except ImportError:
+    log.warning("`orjson` not installed. Google API payloads will use the standard `json` module.")
+    orjson = None
+
+
+def json_dumps(value) -> bytes:
+    """Encodes a value as JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+
+def json_loads(content: bytes | str):
+    """Decodes JSON bytes or text, with orjson when it is installed. Both raise a json.JSONDecodeError."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+class OrjsonModel(JsonModel):
+    """JsonModel for googleapiclient that encodes and decodes the bodies with orjson."""
+
+    def serialize(self, body_value):
+        if isinstance(body_value, dict) and "data" not in body_value and self._data_wrapper:
+            body_value = {"data": body_value}
+        return orjson.dumps(body_value).decode()
+
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return super().deserialize(content)
+        if self._data_wrapper and "data" in body:
+            body = body["data"]
+        return body
+
+
+# Model to be passed to `googleapiclient.discovery.build`, None keeps the default JsonModel.
+JSON_MODEL = OrjsonModel() if orjson else None
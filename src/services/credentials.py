@@ -0,0 +1,38 @@
+from functools import cache
+
+from google.oauth2.credentials import Credentials
+
+from src.constants import GOOGLE_TOKEN, GOOGLE_REFRESH_TOKEN, GOOGLE_TOKEN_URI, GOOGLE_CLIENT_ID, \
+    GOOGLE_CLIENT_SECRET, GOOGLE_SCOPES, LOGISTICA_GOOGLE_TOKEN, LOGISTICA_GOOGLE_REFRESH_TOKEN, \
+    LOGISTICA_GOOGLE_CLIENT_ID, LOGISTICA_GOOGLE_CLIENT_SECRET, LOGISTICA_GOOGLE_SCOPES
+
+
+@cache
+def google_credentials() -> Credentials:
+    """
+    Returns the credentials shared by every Google service of the process.
+
+    Sharing a single instance means the access token is only refreshed when it has expired,
+    instead of once per service built.
+    """
+    return Credentials(
+        token=GOOGLE_TOKEN,
+        refresh_token=GOOGLE_REFRESH_TOKEN,
+        token_uri=GOOGLE_TOKEN_URI,
+        client_id=GOOGLE_CLIENT_ID,
+        client_secret=GOOGLE_CLIENT_SECRET,
+        scopes=GOOGLE_SCOPES
+    )
+
+
+@cache
+def logistica_credentials() -> Credentials:
+    """Returns the credentials shared by every Google service of Logistica's account."""
+    return Credentials(
+        token=LOGISTICA_GOOGLE_TOKEN,
+        refresh_token=LOGISTICA_GOOGLE_REFRESH_TOKEN,
+        token_uri=GOOGLE_TOKEN_URI,
+        client_id=LOGISTICA_GOOGLE_CLIENT_ID,
+        client_secret=LOGISTICA_GOOGLE_CLIENT_SECRET,
+        scopes=LOGISTICA_GOOGLE_SCOPES
+    )
@@ -0,0 +1,26 @@
+from functools import cache
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from src.resources.serializers import JSON_MODEL
+
+
+@cache
+def discovery_document(service_name: str, version: str) -> str | None:
+    """Returns the discovery document packaged with googleapiclient, read from disk only once per process."""
+    return get_static_doc(service_name, version)
+
+
+def build_service(service_name: str, version: str, credentials: Credentials):
+    """
+    Builds the client of a Google API.
+
+    Every worker thread builds its own clients, so the discovery document is read once and shared
+    instead of being loaded by every build. The httplib2 transport of each client keeps its
+    connections alive between requests.
+    """
+    if (document := discovery_document(service_name, version)) is None:
+        return build(service_name, version, credentials=credentials, model=JSON_MODEL, cache_discovery=False)
+    return build_from_document(document, credentials=credentials, model=JSON_MODEL)
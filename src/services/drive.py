@@ -1,29 +1,72 @@
+import threading
+import time
 from pathlib import Path
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_not_exception_type
+from googleapiclient.http import BatchHttpRequest, MediaFileUpload
+from googleapiclient.errors import HttpError
+from httplib2.error import ServerNotFoundError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 from src.config import log
 
-from src.constants import GOOGLE_TOKEN, GOOGLE_REFRESH_TOKEN, GOOGLE_TOKEN_URI, GOOGLE_CLIENT_ID, \
-    GOOGLE_CLIENT_SECRET, GOOGLE_SCOPES, FACTURAS_PDF, FACTURAS_PROCESADAS, FACTURAS_TMP, LOGISTICA_GOOGLE_TOKEN, \
-    LOGISTICA_GOOGLE_REFRESH_TOKEN, LOGISTICA_GOOGLE_CLIENT_ID, LOGISTICA_GOOGLE_CLIENT_SECRET, LOGISTICA_GOOGLE_SCOPES, \
-    XMLS_MUTUALSER
+from src.constants import FACTURAS_PDF, FACTURAS_PROCESADAS, FACTURAS_TMP, XMLS_MUTUALSER
 from src.resources.files import get_mime_type
+from src.services.credentials import google_credentials, logistica_credentials
+from src.services.discovery import build_service
+
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+RESUMABLE_UPLOAD_MIN_SIZE = 5 * 1024 * 1024
+# Seconds a folder listing is trusted. Files uploaded or deleted by the process keep it up to date.
+FOLDER_INDEX_TTL = 300
+# Folders indexed by listing them: small ones whose files are uploaded and deleted by the process.
+# The files of any other folder are looked up by name, since listing them grows with every invoice.
+INDEXED_FOLDERS = (FACTURAS_TMP,)
+
+# Drive answers 403 with one of these reasons when the requests of the user exceed its quota.
+_RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_transient_error(exception: BaseException) -> bool:
+    """Determines if a failed request to Drive is worth retrying: rate limits, server errors and network errors."""
+    if isinstance(exception, HttpError):
+        status = exception.resp.status
+        return status == 429 or status >= 500 or (
+                status == 403 and any(reason in str(exception.content) for reason in _RATE_LIMIT_REASONS))
+    # socket.timeout is TimeoutError, and httplib2 raises ServerNotFoundError when the DNS lookup fails
+    return isinstance(exception, (TimeoutError, ConnectionError, ServerNotFoundError))
+
+
+# Exponential backoff with jitter, so the workers don't retry against Drive all at the same time.
+drive_retry = retry(stop=stop_after_attempt(6), wait=wait_random_exponential(multiplier=0.5, max=16),
+                    retry=retry_if_exception(is_transient_error), reraise=True)
+
+
+def escape_query_value(value: str) -> str:
+    """Escapes a value to be used between single quotes in a Drive search query."""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+
+# Search queries of Drive, their values must be passed through escape_query_value.
+FOLDER_FILES_QUERY = "'{folder_id}' in parents and trashed=false"
+FOLDER_PDFS_QUERY = FOLDER_FILES_QUERY + " and mimeType='application/pdf'"
+FOLDER_FILE_BY_NAME_QUERY = FOLDER_FILES_QUERY + " and name='{name}'"
+FOLDER_BY_NAME_QUERY = "mimeType='application/vnd.google-apps.folder' and name='{name}' and trashed=false"
 
 
 class GoogleDrive:
+    # Google Drive accepts up to 100 calls per batch request.
+    BATCH_SIZE = 100
+
+    # Index of the folders checked before uploading, shared by every instance (one per worker thread).
+    # folder id -> (moment it was listed, {name: file id}), and file id -> (folder id, name).
+    _folder_index: dict[str, tuple[float, dict[str, str]]] = {}
+    _indexed_ids: dict[str, tuple[str, str]] = {}
+    _index_lock = threading.Lock()
+    # One lock per folder held while it is listed, so only the workers waiting for that folder are blocked.
+    _listing_locks: dict[str, threading.Lock] = {}
+
     def __init__(self):
-        self.creds = Credentials(
-            token=GOOGLE_TOKEN,
-            refresh_token=GOOGLE_REFRESH_TOKEN,
-            token_uri=GOOGLE_TOKEN_URI,
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-            scopes=GOOGLE_SCOPES
-        )
-        self.service = build('drive', 'v3', credentials=self.creds)
+        self.creds = google_credentials()
+        self.service = build_service('drive', 'v3', self.creds)
 
         self.facturas_pdf = FACTURAS_PDF
         self.procesadas = FACTURAS_PROCESADAS
@@ -33,34 +76,94 @@ class GoogleDrive:
         """"""
         return f"FacturasMutualser_{ano}{mes:02d}"
 
-    # @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
-    def file_exists_in_folder(self, file_path: Path, folder_id: str, file_type = 'application/pdf') -> dict | None:
+    def file_exists_in_folder(self, file_path: Path, folder_id: str) -> dict | None:
         """
-        Validates if a file exists in a folder given a file name with PDF extension and a folder id.
+        Validates if a file exists in a folder given a file name and a folder id.
+
+        The names of the folders in INDEXED_FOLDERS are looked up in the index of the folder, listed at
+        most once every FOLDER_INDEX_TTL seconds, instead of requesting Drive on every upload.
+        Any other folder is searched by the name of the file.
         
         Args:
             file_path: The file
             folder_id: The ID of the folder to search in
-            file_type: 'application/pdf' by default.
             
         Returns:
             dict: File dictionary with 'id' field if file exists, None otherwise
         """
-        file_type = get_mime_type(file_path) or file_type
-        query = f"'{folder_id}' in parents and name='{file_path.name}' and mimeType='{file_type}' and trashed=false"
+        if folder_id in INDEXED_FOLDERS:
+            file_id = self._folder_files(folder_id).get(file_path.name)
+        else:
+            file_id = self._find_file(file_path.name, folder_id)
+        if file_id:
+            return {'id': file_id}
+        return None
+
+    @drive_retry
+    def _find_file(self, name: str, folder_id: str) -> str | None:
+        """Returns the id of the file with the given name in a folder, if any."""
         response = self.service.files().list(
-            q=query,
+            q=FOLDER_FILE_BY_NAME_QUERY.format(folder_id=escape_query_value(folder_id),
+                                               name=escape_query_value(name)),
             spaces='drive',
-            fields='files(id)'
+            fields='files(id)',
+            pageSize=1,
         ).execute()
-        
         files = response.get('files', [])
-        if files:
-            return {'id': files[0].get('id')}
-        return None
+        return files[0]['id'] if files else None
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), retry=retry_if_not_exception_type(FileNotFoundError),
-           reraise=True)
+    def _folder_files(self, folder_id: str) -> dict[str, str]:
+        """
+        Returns the {name: id} of the files of a folder, listing it again when its index has expired.
+        The folder is listed holding only its own lock, the index lock is held just to read and store it.
+        """
+        with self._index_lock:
+            listing_lock = self._listing_locks.setdefault(folder_id, threading.Lock())
+        with listing_lock:
+            with self._index_lock:
+                listed_at, files = self._folder_index.get(folder_id, (0.0, None))
+                if files is not None and time.monotonic() - listed_at <= FOLDER_INDEX_TTL:
+                    return files
+            files = self._list_folder(folder_id)
+            with self._index_lock:
+                self._folder_index[folder_id] = time.monotonic(), files
+                self._indexed_ids.update((file_id, (folder_id, name)) for name, file_id in files.items())
+            return files
+
+    @drive_retry
+    def _list_folder(self, folder_id: str) -> dict[str, str]:
+        """Lists the name and id of every file of a folder."""
+        files = {}
+        next_page_token = None
+        while True:
+            response = self.service.files().list(
+                q=FOLDER_FILES_QUERY.format(folder_id=escape_query_value(folder_id)),
+                spaces='drive',
+                fields='nextPageToken, files(id, name)',
+                pageSize=1000,
+                pageToken=next_page_token
+            ).execute()
+            files.update((file['name'], file['id']) for file in response.get('files', []))
+            next_page_token = response.get('nextPageToken')
+            if not next_page_token:
+                return files
+
+    def _index_file(self, folder_id: str, name: str, file_id: str) -> None:
+        """Adds a file uploaded by the process to the index of its folder, if the folder is indexed."""
+        with self._index_lock:
+            if (entry := self._folder_index.get(folder_id)) is not None:
+                entry[1][name] = file_id
+                self._indexed_ids[file_id] = folder_id, name
+
+    def _unindex_file(self, file_id: str) -> None:
+        """Removes a file deleted or moved by the process from the index of its folder."""
+        with self._index_lock:
+            if (location := self._indexed_ids.pop(file_id, None)) is not None:
+                folder_id, name = location
+                if (entry := self._folder_index.get(folder_id)) is not None and entry[1].get(name) == file_id:
+                    del entry[1][name]
+
+    @drive_retry
     def upload_file(self, file_path: Path, folder_id: str = None) -> dict:
         """Uploads a file to Google Drive."""
         # Check if file already exists in the folder
@@ -73,16 +176,21 @@ class GoogleDrive:
             'name': file_path.name,
             'parents': [folder_id]
         }
-        media = MediaFileUpload(file_path, resumable=True)
+        # Small files are sent in a single multipart request, without opening an upload session first.
+        # MediaFileUpload learns the size by seeking the file it opens, so this is the only stat.
+        size = file_path.stat().st_size
+        media = MediaFileUpload(str(file_path), mimetype=get_mime_type(file_path),
+                                resumable=size > RESUMABLE_UPLOAD_MIN_SIZE, chunksize=UPLOAD_CHUNK_SIZE)
         file = self.service.files().create(
             body=file_metadata,
             media_body=media,
             fields='id'
         ).execute()
+        self._index_file(folder_id, file_path.name, file['id'])
         log.info(f"\tArchivo {file_path.name!r} ha sido cargado")
         return file
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
+    @drive_retry
     def move_file(self, file_id: str, new_folder_id: str) -> dict:
         """
         Moves a file to a different folder in Google Drive.
@@ -95,16 +203,90 @@ class GoogleDrive:
             removeParents=previous_parents,
             fields='id, parents'
         ).execute()
+        self._unindex_file(file_id)
+        with self._index_lock:
+            self._folder_index.pop(new_folder_id, None)
         return file
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
+    def move_files(self, moves: dict[str, str]) -> None:
+        """
+        Moves several files to different folders in Google Drive with batch requests.
+
+        The parents of every file are requested in one round of batches and the files are moved in a
+        second one, instead of two requests per file as move_file does.
+
+        Args:
+            moves: New folder id of each file id to be moved.
+        """
+        parents = {}
+
+        def parents_callback(request_id: str, response, exception: Exception | None):
+            if exception is not None:
+                log.warning(f"\tArchivo con id {request_id!r} no fue movido: {exception}")
+            else:
+                parents[request_id] = ",".join(response.get('parents', []))
+
+        def move_callback(request_id: str, response, exception: Exception | None):
+            if exception is not None:
+                log.warning(f"\tArchivo con id {request_id!r} no fue movido: {exception}")
+            else:
+                self._unindex_file(request_id)
+
+        file_ids = list(moves)
+        for start in range(0, len(file_ids), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=parents_callback)
+            for file_id in file_ids[start:start + self.BATCH_SIZE]:
+                batch.add(self.service.files().get(fileId=file_id, fields='parents'), request_id=file_id)
+            self._execute_batch(batch)
+
+        file_ids = list(parents)
+        for start in range(0, len(file_ids), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=move_callback)
+            for file_id in file_ids[start:start + self.BATCH_SIZE]:
+                batch.add(self.service.files().update(fileId=file_id, addParents=moves[file_id],
+                                                      removeParents=parents[file_id], fields='id, parents'),
+                          request_id=file_id)
+            self._execute_batch(batch)
+
+        with self._index_lock:
+            for folder_id in set(moves.values()):
+                self._folder_index.pop(folder_id, None)
+
+    @drive_retry
     def delete_file(self, file_id: str) -> None:
         """
-        Deletes a file from Google Drive.
+        Deletes a file from Google Drive. A file that no longer exists (404) is taken as deleted,
+        e.g. when the index of its folder still listed a file deleted outside the process.
         """
-        self.service.files().delete(fileId=file_id).execute()
+        try:
+            self.service.files().delete(fileId=file_id).execute()
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            log.info(f"\tArchivo con id {file_id!r} ya había sido eliminado")
+        self._unindex_file(file_id)
+
+    def delete_files(self, file_ids: list[str]) -> None:
+        """Deletes several files from Google Drive with batch requests, instead of one request per file."""
+
+        def callback(request_id: str, response, exception: Exception | None):
+            if exception is not None:
+                log.warning(f"\tArchivo con id {request_id!r} no fue eliminado: {exception}")
+            else:
+                self._unindex_file(request_id)
+
+        for start in range(0, len(file_ids), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for file_id in file_ids[start:start + self.BATCH_SIZE]:
+                batch.add(self.service.files().delete(fileId=file_id), request_id=file_id)
+            self._execute_batch(batch)
+
+    @drive_retry
+    def _execute_batch(self, batch: BatchHttpRequest) -> None:
+        """Executes a batch request, its callback is called once per request of the batch."""
+        batch.execute()
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
+    @drive_retry
     def exclude_duplicated_files(self) -> list:
         """
         Goes through self.facturas_pdf folder and excludes duplicated files based on the name.
@@ -113,11 +295,13 @@ class GoogleDrive:
         Returns:
             list: List of file dictionaries with 'id' and 'name' fields for the remaining unique files.
         """
-        query = f"'{self.facturas_pdf}' in parents and trashed=false and mimeType='application/pdf'"
-        all_files = []
+        query = FOLDER_PDFS_QUERY.format(folder_id=escape_query_value(self.facturas_pdf))
         next_page_token = None
-        
-        # Fetch all files from the folder (handling pagination)
+
+        # Track seen file names while fetching the pages of the folder
+        seen_names = set()
+        unique_files = []
+        duplicated_ids = []
 
         while True:
             response = self.service.files().list(
@@ -128,51 +312,52 @@ class GoogleDrive:
                 pageSize=1000,
                 pageToken=next_page_token
             ).execute()
-            
-            files = response.get('files', [])
-            all_files.extend(files)
-            
+
+            for file in response.get('files', []):
+                file_name = file.get('name')
+                if file_name not in seen_names:
+                    seen_names.add(file_name)
+                    unique_files.append(file)
+                else:
+                    duplicated_ids.append(file.get('id'))
+                    print(f'Removing duplicated file {file_name!r}')
+
             next_page_token = response.get('nextPageToken')
             if not next_page_token:
                 break
-        
-        # Track seen file names and delete duplicates
-        seen_names = set()
-        unique_files = []
-        
-        for file in all_files:
-            file_name = file.get('name')
-            if file_name not in seen_names:
-                seen_names.add(file_name)
-                unique_files.append(file)
-            else:
-                # Delete duplicate file from Google Drive
-                self.delete_file(file.get('id'))
-                print(f'Removing duplicated file {file.get('name')!r}')
+
+        # Delete duplicate files from Google Drive once the listing is complete, so the pages don't shift
+        self.delete_files(duplicated_ids)
         
         return unique_files
 
 
 class GoogleDriveLogistica:
     def __init__(self):
-        self.creds = Credentials(
-            token=LOGISTICA_GOOGLE_TOKEN,
-            refresh_token=LOGISTICA_GOOGLE_REFRESH_TOKEN,
-            token_uri=GOOGLE_TOKEN_URI,
-            client_id=LOGISTICA_GOOGLE_CLIENT_ID,
-            client_secret=LOGISTICA_GOOGLE_CLIENT_SECRET,
-            scopes=LOGISTICA_GOOGLE_SCOPES
-        )
-        self.service = build('drive', 'v3', credentials=self.creds)
+        self.creds = logistica_credentials()
+        self.service = build_service('drive', 'v3', self.creds)
 
         self.xmls = XMLS_MUTUALSER
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
+    # Folder ids already resolved, shared by every instance (one per worker thread).
+    _folder_ids: dict[str, str] = {}
+    _folder_lock = threading.Lock()
+
     def create_or_get_folder_id(self, folder_name: str) -> str:
         """
         Gets a folder by name or creates it if it doesn't exist.
+
+        The id is cached for the whole process, and the lock prevents two workers from creating the same folder.
         """
-        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
+        with self._folder_lock:
+            if folder_name not in self._folder_ids:
+                self._folder_ids[folder_name] = self._create_or_get_folder_id(folder_name)
+            return self._folder_ids[folder_name]
+
+    @drive_retry
+    def _create_or_get_folder_id(self, folder_name: str) -> str:
+        """Looks for the folder in Google Drive, creating it when it doesn't exist."""
+        query = FOLDER_BY_NAME_QUERY.format(name=escape_query_value(folder_name))
         response = self.service.files().list(
             q=query,
             spaces='drive',
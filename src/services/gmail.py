@@ -2,37 +2,56 @@ import base64
 import re
 import ssl
 from datetime import datetime
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 from email.utils import formataddr
+from functools import cache
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
 from tenacity import retry, stop_after_attempt, wait_fixed
 
 from src.config import CONFIG, BASE_DIR
-from src.constants import LOGI_NIT, GOOGLE_TOKEN, GOOGLE_SCOPES, GOOGLE_REFRESH_TOKEN, GOOGLE_TOKEN_URI, \
-    GOOGLE_CLIENT_ID, \
-    GOOGLE_CLIENT_SECRET, Emails, GMAIL_QUERY
+from src.constants import LOGI_NIT, Emails, GMAIL_QUERY
 from src.decorators import production_only
 from src.models.google import EmailMessage
+from src.services.credentials import google_credentials
+from src.services.discovery import build_service
+
+# Multiple of 4, so every slice of a base64 string can be decoded on its own.
+_B64_CHUNK_SIZE = 4 * 256 * 1024
+DEFAULT_TEMPLATE = BASE_DIR / "src" / "resources" / "error_con_factura.html"
+# Variables of the templates, written as ${name}.
+_TEMPLATE_VAR_RE = re.compile(r"\$\{([a-zA-Z0-9_]+)\}")
+
+
+def write_b64_to_file(data: str, file_path: Path) -> Path:
+    """Decodes a base64url string into a file slice by slice, without building the whole decoded content in memory."""
+    with open(file_path, 'wb') as f:
+        for start in range(0, len(data), _B64_CHUNK_SIZE):
+            f.write(base64.urlsafe_b64decode(data[start:start + _B64_CHUNK_SIZE]))
+    return file_path
+
+
+@cache
+def read_template(template_file: Path) -> str:
+    """Returns the content of an e-mail template, read from disk only the first time."""
+    if not template_file.exists():
+        raise FileNotFoundError(f"Template file not found: {template_file}")
+    return template_file.read_text(encoding="utf-8")
 
 
 class GmailAPIReader:
     """A class to interact with the Gmail API."""
+    # Google recommends batches of 50 requests at most for Gmail to avoid rate limiting.
+    BATCH_SIZE = 50
 
     def __init__(self) -> None:
-        """Initializes the GmailAPIReader with credentials from environment variables."""
-        self.creds = Credentials(
-            token=GOOGLE_TOKEN,
-            refresh_token=GOOGLE_REFRESH_TOKEN,
-            token_uri=GOOGLE_TOKEN_URI,
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-            # scopes=[scope for scope in GOOGLE_SCOPES if 'gmail' in scope]
-            scopes=GOOGLE_SCOPES
-        )
-        self.service = build('gmail', 'v1', credentials=self.creds)
+        """Initializes the GmailAPIReader with the credentials shared by the Google services."""
+        self.creds = google_credentials()
+        self.service = build_service('gmail', 'v1', self.creds)
 
     @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
     def _list_messages(self, query: str, next_page_token: str = None) -> Dict[str, Any]:
@@ -65,7 +84,42 @@ class GmailAPIReader:
 
     def fetch_email_details(self, message: EmailMessage) -> None:
         """Fetches the details of an email and updates the EmailMessage object."""
-        msg = self._get_message(message_id=message.id, msg_format='full')
+        self._set_details(message, self._get_message(message_id=message.id, msg_format='full'))
+
+    def fetch_many_details(self, messages: List[EmailMessage]) -> None:
+        """
+        Fetches the details of several emails with batch requests, instead of one request per email.
+
+        The messages whose request failed inside the batch are fetched again one by one.
+        """
+        by_id = {message.id: message for message in messages}
+        failed: Dict[str, EmailMessage] = {}
+
+        def callback(request_id: str, response: Dict[str, Any], exception: Optional[Exception]):
+            if exception is not None:
+                failed[request_id] = by_id[request_id]
+            else:
+                failed.pop(request_id, None)
+                self._set_details(by_id[request_id], response)
+
+        for start in range(0, len(messages), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for message in messages[start:start + self.BATCH_SIZE]:
+                request = self.service.users().messages().get(userId='me', id=message.id, format='full')
+                batch.add(request, request_id=message.id)
+            self._execute_batch(batch)
+
+        for message in failed.values():
+            self.fetch_email_details(message)
+
+    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
+    def _execute_batch(self, batch: BatchHttpRequest) -> None:
+        """Executes a batch request, its callback is called once per request of the batch."""
+        batch.execute()
+
+    @staticmethod
+    def _set_details(message: EmailMessage, msg: Dict[str, Any]) -> None:
+        """Updates the EmailMessage object with the headers, html body and attachment id of the message."""
         payload = msg.get('payload', {})
         headers = payload.get('headers', [])
 
@@ -83,21 +137,19 @@ class GmailAPIReader:
                 if part['mimeType'] == 'text/html':
                     data = part['body']['data']
                     message.body_html = base64.urlsafe_b64decode(data).decode('utf-8')
+                if not message.attachment_id and part.get('body', {}).get('attachmentId'):
+                    message.attachment_id = part['body']['attachmentId']
 
     def download_attachment(self, message: EmailMessage) -> Optional[Path]:
         """Downloads the attachment of an email."""
-        msg = self._get_message(message_id=message.id, msg_format='full')
-        for part in msg['payload']['parts']:
-            if part.get('body') and part.get('body').get('attachmentId'):
-                attachment = self._get_attachment(message_id=message.id, attachment_id=part['body']['attachmentId'])
-                file_data = base64.urlsafe_b64decode(attachment['data'].encode('UTF-8'))
-                if message.zip_name:
-                    message.attachment_path = CONFIG.DIRECTORIES.TEMP / message.zip_name
-                    if message.attachment_path.exists():
-                        continue
-                    with open(message.attachment_path, 'wb') as f:
-                        f.write(file_data)
-                    return message.attachment_path
+        if not message.attachment_id:
+            self.fetch_email_details(message)
+        if message.attachment_id and message.zip_name:
+            message.attachment_path = CONFIG.DIRECTORIES.TEMP / message.zip_name
+            if message.attachment_path.exists():
+                return None
+            attachment = self._get_attachment(message_id=message.id, attachment_id=message.attachment_id)
+            return write_b64_to_file(attachment['data'], message.attachment_path)
         return None
 
     @retry(stop=stop_after_attempt(10), wait=wait_fixed(1), reraise=True)
@@ -132,24 +184,17 @@ class GmailAPIReader:
             FileNotFoundError: If the template file does not exist.
             Exception: If sending the email fails.
         """
-        from email.mime.multipart import MIMEMultipart
-        from email.mime.text import MIMEText
-        import re
-
         if template_path is None:
-            template_path = BASE_DIR / "src" / "resources" / "error_con_factura.html"
+            template_path = DEFAULT_TEMPLATE
 
         if bcc is None:
             bcc = Emails.LOGIFARMA_DEV
 
-        template_file = Path(template_path)
-        if not template_file.exists():
-            raise FileNotFoundError(f"Template file not found: {template_path}")
-        html_content = template_file.read_text(encoding="utf-8")
+        html_content = read_template(Path(template_path))
         def replace_var(match):
             var_name = match.group(1)
             return str(body_vars.get(var_name, f"${{{var_name}}}"))
-        html_body = re.sub(r"\$\{([a-zA-Z0-9_]+)\}", replace_var, html_content)
+        html_body = _TEMPLATE_VAR_RE.sub(replace_var, html_content)
 
         message = MIMEMultipart()
         message["to"] = to
@@ -162,7 +207,6 @@ class GmailAPIReader:
         message.attach(MIMEText(html_body, "html"))
 
         if attachment_file.exists():
-            from email.mime.application import MIMEApplication
             with open(attachment_file, 'rb') as f:
                 part = MIMEApplication(f.read(), Name=attachment_file.name)
             part['Content-Disposition'] = f'attachment; filename="{attachment_file.name}"'
@@ -183,8 +227,8 @@ if __name__ == '__main__':
         for email_message in email_messages:
             gmail_reader.fetch_email_details(email_message)
             print(f"Processing message ID: {email_message.id}")
-            if email_message.soup:
-                print("Email body converted to BeautifulSoup object.")
+            if email_message.tree is not None:
+                print("Email body parsed to an lxml tree.")
 
             # attachment_path = gmail_reader.download_attachment(email_message)
             # if attachment_path:
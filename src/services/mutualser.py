@@ -5,58 +5,163 @@ This script provides a self-sufficient client class for authenticating and
 making requests to the MutualSer API endpoints. It automatically handles
 token acquisition and renewal.
 """
+import json
+import random
+import threading
 import uuid
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 from functools import wraps
 
 import requests
 from google.api_core.exceptions import ServiceUnavailable
-from requests import JSONDecodeError
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
-from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_exception, retry_if_exception_type, stop_after_attempt, wait_exponential, \
+    wait_fixed
 from urllib3.exceptions import HTTPError
+from urllib3.util.retry import Retry
 
 from src.config import BASE_DIR, log
 from src.decorators import production_only
 from src.models.mutualser import FileLinkRequest, FileLinkResponse, UploadFilesRequest, FindLoadResponse
 
 from src.constants import LOGI_NIT, MUTUALSER_USERNAME, MUTUALSER_PASSWORD, BASE_URL_AUTH, BASE_URL_API, PORTAL_URL, \
-    USER_ID
+    USER_ID, MAX_WORKERS
 from src.resources.exceptions import ServiceUnavailableError
 from src.resources.files import extract_nro_factura_from_file
+from src.resources.serializers import json_dumps, json_loads
+
+STATIC_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                     'Chrome/108.0.0.0 Safari/537.36')
+
+try:
+    from fake_useragent import UserAgent
+    # Loading the user agents bundled with the package is expensive, so it is done once per process.
+    _USER_AGENTS = UserAgent()
+except ImportError:
+    log.warning("`fake-useragent` not installed. Using a static User-Agent.")
+    _USER_AGENTS = None
+
+# Token shared by every client of the process, so new clients (one per worker thread)
+# and new scheduled runs do not log in again while the token is still valid.
+_token_cache: Dict[str, Any] = {"headers": None, "exp": 0.0}
+_token_lock = threading.Lock()
+_TOKEN_EXPIRY_MARGIN = 60
+_DEFAULT_TOKEN_LIFETIME = 300
+
+# Polling of findLoad: capped exponential backoff, each delay randomized by +/- POLL_JITTER.
+POLL_BASE_DELAY = 1.0
+POLL_MAX_DELAY = 15.0
+POLL_JITTER = 0.5
+# Statuses the API answers when it is overloaded, they may come with a Retry-After header.
+_THROTTLED_STATUSES = (429, 503)
+
+# Requests of an upload that don't depend on the previous step run here, while the worker does the other one.
+_requests_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='mutualser')
+
+# Host of the signed URLs where the invoices are uploaded.
+GOOGLE_STORAGE_URL = 'https://storage.googleapis.com'
+
+
+def _token_expired() -> bool:
+    """Determines if the token cached at process level is missing or about to expire."""
+    return time.monotonic() >= _token_cache['exp'] - _TOKEN_EXPIRY_MARGIN
+
+
+def _poll_delay(attempt: int) -> float:
+    """Seconds to wait before polling again, after the given attempt (starting at 0)."""
+    delay = min(POLL_MAX_DELAY, POLL_BASE_DELAY * 2 ** attempt)
+    return delay * (1 + random.uniform(-POLL_JITTER, POLL_JITTER))
+
+
+def _retry_after(response: requests.Response) -> float | None:
+    """Seconds requested by the Retry-After header of a response, given either as seconds or as a date."""
+    if not (value := response.headers.get('Retry-After')):
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_response(exception: BaseException) -> requests.Response | None:
+    """Response of a failed request, a ServiceUnavailableError takes it from the RequestException it was raised from."""
+    if isinstance(exception, ServiceUnavailableError):
+        exception = exception.__cause__
+    return getattr(exception, 'response', None)
+
+
+def _is_transient_error(exception: BaseException) -> bool:
+    """Determines if a failed request is worth retrying: a server error or no response at all."""
+    return isinstance(exception, (RequestException, ServiceUnavailableError)) and (
+            (response := _error_response(exception)) is None or response.status_code >= 500)
+
+
+# Retries the login when the auth endpoint fails transiently, instead of failing the invoice at once.
+_login_retry = retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, max=30),
+                     retry=retry_if_exception(_is_transient_error), reraise=True)
+
+
+# Last tick (in tenths of millisecond) given to an upload code, so concurrent uploads never share one.
+_last_codigo_tick = 0
+_codigo_lock = threading.Lock()
+
+
+def _new_codigo() -> str:
+    """
+    Code of an upload, the local time as YYYYmmddHHMMSS followed by the tenths of millisecond.
+    Two uploads starting in the same tick get consecutive ticks, so every code of the process is unique.
+    """
+    global _last_codigo_tick
+    with _codigo_lock:
+        _last_codigo_tick = tick = max(time.time_ns() // 100_000, _last_codigo_tick + 1)
+    return time.strftime('%Y%m%d%H%M%S', time.localtime(tick // 10_000)) + f"{tick % 10_000:04d}"
 
 
 def _token_required(func):
     """
-    Decorator to ensure that a valid access token is present before making an API call.
+    Decorator to ensure that an access token is present before making an API call.
     If the token is missing or a 401 Unauthorized error occurs, it triggers a login
-    and retries the original request.
+    and retries the original request. The expiry of the token is not checked here but
+    once per upload (see MutualSerAPIClient.ensure_token).
+
+    Server and connection errors are retried as well, with exponential backoff, up to
+    MutualSerAPIClient.MAX_RETRIES attempts. Any other error is raised at once.
     """
 
     @wraps(func)
     def wrapper(client_instance: 'MutualSerAPIClient', *args, **kwargs):
         # If we have never logged in, do it first.
         if not client_instance.access_token:
-            log.info("No token found. Performing initial login.")
+            log.info("No valid token found. Performing login.")
             client_instance.login()
 
-        try:
-            # Attempt the decorated API call
-            return func(client_instance, *args, **kwargs)
-        except RequestException as e:
-            # If the request failed with a 401, our token likely expired.
-            if e.response is not None and e.response.status_code == 401:
-                log.warning("Token expired or invalid (401). Re-authenticating.")
-                client_instance.login()  # Re-login to get a new token
-                log.info("Re-authentication successful. Retrying the original request.")
-                # Retry the decorated API call one more time
+        for attempt in range(client_instance.MAX_RETRIES):
+            try:
+                # Attempt the decorated API call
                 return func(client_instance, *args, **kwargs)
-            else:
-                # For any other request exception, re-raise it.
-                raise
+            except (RequestException, ServiceUnavailableError) as e:
+                if attempt == client_instance.MAX_RETRIES - 1:
+                    raise
+                # If the request failed with a 401, our token likely expired.
+                if (response := _error_response(e)) is not None and response.status_code == 401:
+                    log.warning("Token expired or invalid (401). Re-authenticating.")
+                    client_instance.login(force=True)  # Re-login to get a new token
+                    log.info("Re-authentication successful. Retrying the original request.")
+                elif _is_transient_error(e):
+                    delay = min(30, 2 ** attempt + random.random())
+                    log.warning(f"{func.__name__} falló ({e}). Reintentando en {delay:.1f} segundos.")
+                    time.sleep(delay)
+                else:
+                    # For any other request exception, re-raise it.
+                    raise
 
     return wrapper
 
@@ -82,16 +187,40 @@ class MutualSerAPIClient:
     _ORGANIZACION_NAME = "LOGIFARMA S.A.S."
     _USER_ID = USER_ID
 
+    # Static part of the headers, the dynamic values are merged into a copy on every use.
+    _BASE_HEADERS = {
+        'accept': 'application/json, text/plain, */*',
+        'accept-language': 'en-US,en;q=0.9',
+        'cache-control': 'no-cache',
+        'content-type': 'application/json',
+        'origin': PORTAL_URL,
+        'pragma': 'no-cache',
+        'referer': PORTAL_URL,
+    }
+    _CONFIG_INFO_HEADERS = {
+        'organizacion': _ORGANIZACION_ID,
+        'organizacionname': _ORGANIZACION_NAME,
+        'user-id': _USER_ID,
+        'roles': '15574sad',
+    }
+
+    # Attempts of every API call made through @_token_required
+    MAX_RETRIES = 3
+
     def __init__(self):
         """
         Initializes the API client.
         Loads credentials from environment variables and sets up a session.
         """
         self._load_credentials()
-        self.session = requests.Session()
+        self.session = self._build_session()
+        # Used by the request that runs on _requests_pool during an upload, so it never shares self.session
+        self._side_session = self._build_session()
         self.access_token: Optional[str] = None
         self.user_details: Dict[str, Any] = {'usuario': MUTUALSER_USERNAME, 'email': MUTUALSER_USERNAME}
         self.codigo = ''
+        # Id of the 'ZIP_REG-FACT' type, the same for every upload of the organization
+        self._tipo_id: Optional[str] = None
 
     @property
     def transaction_id(self) -> str:
@@ -104,6 +233,21 @@ class MutualSerAPIClient:
             )
         return trans_id
 
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """
+        Creates the session with a connection pool, so the TCP/TLS connections are kept alive between uploads.
+        Only the connection errors are retried, since the request never reached the API.
+        """
+        session = requests.Session()
+        retries = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.5)
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # The signed URLs point to Google's storage, its own pool keeps that connection warm between invoices
+        session.mount(GOOGLE_STORAGE_URL, HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retries))
+        return session
+
     def _load_credentials(self):
         """Loads username and password from environment variables."""
         self.username = MUTUALSER_USERNAME
@@ -114,52 +258,73 @@ class MutualSerAPIClient:
 
     def _get_base_headers(self) -> Dict[str, str]:
         """Generates a set of base headers with a dynamic User-Agent."""
-        try:
-            from fake_useragent import UserAgent
-            user_agent = UserAgent().random
-        except ImportError:
-            log.warning("`fake-useragent` not installed. Using a static User-Agent.")
-            user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-
-        return {
-            'accept': 'application/json, text/plain, */*',
-            'accept-language': 'en-US,en;q=0.9',
-            'cache-control': 'no-cache',
-            'content-type': 'application/json',
-            'origin': PORTAL_URL,
-            'pragma': 'no-cache',
-            'referer': PORTAL_URL,
-            'user-agent': user_agent,
-        }
+        user_agent = _USER_AGENTS.random if _USER_AGENTS is not None else STATIC_USER_AGENT
+        return self._BASE_HEADERS | {'user-agent': user_agent}
+
+    def _make_request(self, method: str, endpoint: str, base_url: Optional[str] = None,
+                      session: Optional[requests.Session] = None, **kwargs: Any) -> dict[Any, Any] | None | Any:
+        """
+        A generic helper method to execute API requests, with `self.session` unless another one is given.
 
-    def _make_request(self, method: str, endpoint: str, base_url: Optional[str] = None, **kwargs: Any) -> dict[
-                                                                                                              Any, Any] | None | Any:
-        """A generic helper method to execute API requests."""
+        A `json` payload is encoded here (with orjson when installed) instead of by requests,
+        and the response is decoded the same way.
+        """
         final_base_url = base_url or self._BASE_URL_AUTH
         url = f"{final_base_url}{endpoint}"
+        if 'json' in kwargs:
+            kwargs['data'] = json_dumps(kwargs.pop('json'))
+            kwargs['headers'] = {**kwargs.get('headers', {}), 'content-type': 'application/json'}
         try:
-            if endpoint == self.UPLOAD_RIPS_ENDPOINT:
-                self.codigo = datetime.now().strftime("%Y%m%d%H%M%S%f")[:-2]
-            response = self.session.request(method, url, **kwargs)
+            response = (session or self.session).request(method, url, **kwargs)
             response.raise_for_status()
-            return {} if response.status_code == 204 else response.json()
-        except JSONDecodeError:
+            return {} if response.status_code == 204 else json_loads(response.content)
+        except json.JSONDecodeError:
             if endpoint == self.UPLOAD_RIPS_ENDPOINT:
                 return {}
         except requests.exceptions.SSLError:
             raise
         except RequestException as e:
-            if response and response.status_code in (503,):
-                raise ServiceUnavailableError(f"API de Mutual ser arrojó error: {e}")
+            if e.response is not None and e.response.status_code == 503:
+                raise ServiceUnavailableError(f"API de Mutual ser arrojó error: {e}") from e
             log.error(f"API request to {url} failed: {e}")
             raise
 
-    def login(self) -> None:
+    def login(self, force: bool = False) -> None:
         """
         Authenticates using instance credentials, creates a dynamic User-Agent,
         and sets the base headers for the session.
         This method is called automatically by the @_token_required decorator.
+
+        The headers obtained are cached at process level until the token is close to expire,
+        so the login endpoint is only requested when the cached token is missing, expired or
+        when `force` is True (e.g. after a 401) and no other client has renewed it meanwhile.
+
+        The session headers are updated, not replaced, so the context of an upload in progress
+        (see get_config_info) survives a login in the middle of it.
+        """
+        with _token_lock:
+            renewed_by_other = (_token_cache['headers'] is not None and
+                                _token_cache['headers']['Authorization'] != self.session.headers.get('Authorization'))
+            if _token_expired() or (force and not renewed_by_other):
+                _token_cache['headers'], _token_cache['exp'] = self._request_token()
+            session_headers = _token_cache['headers']
+
+        self.access_token = session_headers['Authorization'].split(' ', 1)[1]
+        self._tipo_id = None
+        self.session.headers.update(session_headers)
+
+    def ensure_token(self) -> None:
+        """
+        Logs in when the token of the client is missing or about to expire, or takes the one
+        renewed by another client of the process. Called once at the start of every upload.
         """
+        if (not self.access_token or _token_expired() or
+                _token_cache['headers']['Authorization'] != self.session.headers.get('Authorization')):
+            self.login()
+
+    @_login_retry
+    def _request_token(self) -> tuple[Dict[str, str], float]:
+        """Performs the login request and returns the session headers with the moment they expire."""
         # log.info(f"Attempting to log in as {self.username}...")
         payload = {'username': self.username, 'password': self.password}
 
@@ -173,10 +338,10 @@ class MutualSerAPIClient:
             headers=login_headers
         )
 
-        self.access_token = login_response.get('access_token')
+        access_token = login_response.get('access_token')
         token_type = login_response.get('token_type', 'Bearer')
 
-        if not self.access_token:
+        if not access_token:
             raise ValueError("Login failed: 'access_token' not found in response.")
 
         # Store user details from the response for later use in other requests
@@ -185,12 +350,11 @@ class MutualSerAPIClient:
         #     'username': login_response.get('preferred_username'),
         # }
 
-        # Set the base headers and auth token for all subsequent requests in this session.
-        auth_header = f"{token_type.capitalize()} {self.access_token}"
-        self.session.headers.clear()
-        self.session.headers.update(login_headers)
-        self.session.headers.update({'Authorization': auth_header})
+        # The base headers and auth token for all subsequent requests in the session.
+        auth_header = f"{token_type.capitalize()} {access_token}"
+        expires_in = login_response.get('expires_in') or _DEFAULT_TOKEN_LIFETIME
         log.info("Authorization token and base headers have been successfully set for the session.")
+        return {**login_headers, 'Authorization': auth_header}, time.monotonic() + float(expires_in)
 
     def _update_api_headers(self, api_headers: Dict[str, str]) -> None:
         """
@@ -213,7 +377,9 @@ class MutualSerAPIClient:
         Fetches application configuration and returns the ID of a specific type.
 
         This method requires extra user and organization context in the headers.
-        It also enriches the session headers for subsequent API calls.
+        It also enriches the session headers for subsequent API calls, with a new
+        transaction-id on every call. The ID is only requested to the API the first
+        time after each login, then it is reused.
 
         Args:
             codigo_aplicacion (str): The application code to query (e.g., 'REG-FACT').
@@ -225,17 +391,16 @@ class MutualSerAPIClient:
         Raises:
             ValueError: If the specified type code is not found in the response.
         """
-        # These headers are specific to this request. They will be merged with
-        # session headers for this call and then stored for subsequent requests.
-        request_headers = {
+        # These headers are stored in the session for this call and the subsequent requests,
+        # so they are not passed again on every request.
+        self._update_api_headers(self._CONFIG_INFO_HEADERS | {
             'email': self.user_details.get('email', ''),
             'usuario': self.user_details.get('usuario', ''),
-            'organizacion': self._ORGANIZACION_ID,
-            'organizacionname': self._ORGANIZACION_NAME,
-            'user-id': self._USER_ID,
-            'roles': '15574sad',
             'transaction-id': str(uuid.uuid4()),
-        }
+        })
+
+        if self._tipo_id is not None:
+            return self._tipo_id
 
         params = {'codigo_aplicacion': 'REG-FACT'}
 
@@ -244,24 +409,19 @@ class MutualSerAPIClient:
             method='GET',
             endpoint=self.CONFIG_INFO_ENDPOINT,
             base_url=self._BASE_URL_API,
-            params=params,
-            headers=request_headers
+            params=params
         )
 
-        # After the first successful call, update the session headers with this context.
-        self._update_api_headers(request_headers)
-
         # Process the response to find the required ID
         tipo_codigo = 'ZIP_REG-FACT'
-        for tipo in config_data.get('tipos', []):
-            if tipo.get('codigo') == tipo_codigo:
-                tipo_id = tipo.get('id')
-                # log.info(f"Found matching type '{tipo_codigo}' with ID: {tipo_id}")
-                if not tipo_id:
-                    raise ValueError(f"Type '{tipo_codigo}' found, but it has no 'id'.")
-                return tipo_id
-
-        raise ValueError(f"Could not find a type with codigo '{tipo_codigo}' in the response.")
+        tipo = next((tipo for tipo in config_data.get('tipos', []) if tipo.get('codigo') == tipo_codigo), None)
+        if tipo is None:
+            raise ValueError(f"Could not find a type with codigo '{tipo_codigo}' in the response.")
+        if not (tipo_id := tipo.get('id')):
+            raise ValueError(f"Type '{tipo_codigo}' found, but it has no 'id'.")
+        # log.info(f"Found matching type '{tipo_codigo}' with ID: {tipo_id}")
+        self._tipo_id = tipo_id
+        return tipo_id
 
     @_token_required
     def upload_rips_file(self, tipo_id: str, file_name: Path) -> None:
@@ -294,6 +454,14 @@ class MutualSerAPIClient:
     @_token_required
     def get_url_upload_file(self):
         """Get the URL necessary to upload the file to Google."""
+        return self._request_url_upload_file()
+
+    def _request_url_upload_file(self, session: Optional[requests.Session] = None,
+                                 headers: Optional[Dict[str, str]] = None) -> FileLinkResponse:
+        """
+        Requests the URL to upload the file to Google, with the given session and headers.
+        It never logs in, so it can run on another thread than the one using `self.session`.
+        """
         # log.info(f"Getting Google URL for file.")
 
         file_link_req = FileLinkRequest(fileNames=f"{self.codigo}.zip")
@@ -302,6 +470,8 @@ class MutualSerAPIClient:
             method='GET',
             endpoint=self.GET_URL_UPLOAD_FILE,
             base_url=self._BASE_URL_API,
+            session=session,
+            headers=headers,
             params=file_link_req.model_dump(mode='json')
         )
 
@@ -313,15 +483,9 @@ class MutualSerAPIClient:
         """Upload file to google based on URL to be requested."""
         log.info(f"{extract_nro_factura_from_file(file_path)} Cargando archivo {file_path.name} en Mutualser")
         # self._update_api_headers({"Content-Type": "application/x-www-form-urlencoded"})
+        # The file is streamed from disk while it is sent, requests sets its Content-Length.
         with open(file_path, 'rb') as file:
-            file_content = file.read()
-            file_size = len(file_content)
-            content_lengt = str(file_size)
-
-        self._update_api_headers({"Content-Type": "application/zip", 'Content-Length': content_lengt})
-        self.session.request('PUT', gurl, data=file_content)
-        self._update_api_headers({"Content-Type": 'application/json'})
-        del self.session.headers['Content-Length']
+            self.session.request('PUT', gurl, data=file, headers={"Content-Type": "application/zip"})
 
     @_token_required
     def upload_files(self, tipo_id: str, file_name: Path):
@@ -345,15 +509,17 @@ class MutualSerAPIClient:
         return response
 
     @_token_required
-    def find_load_status(self, max_retries: int = 10, delay_seconds: int = 6) -> FindLoadResponse:
+    def find_load_status(self, max_retries: int = 10) -> FindLoadResponse:
         """
         Polls the findLoad endpoint to check the status of the file upload.
 
-        It checks the 'estado' field and retries if it is 'EN_PROCESO'.
+        It checks the 'estado' field and retries if it is 'EN_PROCESO', unless the file already
+        has an error message (see FindLoadResponse.terminal_error), waiting between polls
+        with capped exponential backoff and jitter (see _poll_delay). When the API answers
+        429 or 503, the Retry-After header is honored if present.
 
         Args:
             max_retries (int): The maximum number of times to poll the endpoint.
-            delay_seconds (int): The number of seconds to wait between retries.
 
         Returns:
             Dict[str, Any]: The final response from the findLoad endpoint.
@@ -373,23 +539,31 @@ class MutualSerAPIClient:
 
         for attempt in range(max_retries):
             # log.info(f"Polling attempt {attempt + 1}/{max_retries}...")
-            response = self._make_request(
-                method='POST',
-                endpoint=self.FIND_LOAD_ENDPOINT,
-                base_url=self._BASE_URL_API,
-                json=payload
-            )
-
-            resp_obj = FindLoadResponse(**response)
-            # log.info(f"Current upload status is: {resp_obj.estado_basado_en_archivos}")
+            delay = _poll_delay(attempt)
+            try:
+                response = self._make_request(
+                    method='POST',
+                    endpoint=self.FIND_LOAD_ENDPOINT,
+                    base_url=self._BASE_URL_API,
+                    json=payload
+                )
+            except (RequestException, ServiceUnavailableError) as e:
+                if ((error_response := _error_response(e)) is None
+                        or error_response.status_code not in _THROTTLED_STATUSES or attempt == max_retries - 1):
+                    raise
+                delay = _retry_after(error_response) or delay
+            else:
+                resp_obj = FindLoadResponse(**response)
+                # log.info(f"Current upload status is: {resp_obj.estado_basado_en_archivos}")
 
-            if resp_obj.done:
-                # log.info("Upload processing finished.")
-                return resp_obj
+                # A file rejected by the API won't be loaded, waiting for it would only exhaust the attempts
+                if resp_obj.done or resp_obj.terminal_error:
+                    # log.info("Upload processing finished.")
+                    return resp_obj
 
             if attempt < max_retries - 1:
-                # log.info(f"Status is still 'EN_PROCESO'. Waiting for {delay_seconds} seconds before retrying.")
-                time.sleep(delay_seconds)
+                # log.info(f"Status is still 'EN_PROCESO'. Waiting for {delay:.1f} seconds before retrying.")
+                time.sleep(delay)
 
         raise ValueError(f"Después de {max_retries} intentos, no se cargó la factura. "
                          f"Último estado de API fue {resp_obj.estado_basado_en_archivos!r}. "
@@ -399,13 +573,24 @@ class MutualSerAPIClient:
     @production_only
     def upload_file(self, filepath: Path) -> FindLoadResponse | None:
         """Main function to upload the file into Mutualser."""
+        # Code of this upload, used to name the file uploaded to Google
+        self.codigo = _new_codigo()
         try:
+            # 0. The token is checked once per upload, it is only renewed later if the API rejects it
+            self.ensure_token()
             # 1. Directly call a protected method. The decorator handles login automatically.
             tipo_id = self.get_config_info()
-            # 2. Upload the RIPS file information
+            # 3. Get the URL necessary to upload the file to Google, it only depends on self.codigo.
+            # It runs on its own session with a copy of the headers, the worker keeps using self.session
+            url_request = _requests_pool.submit(self._request_url_upload_file, self._side_session,
+                                                dict(self.session.headers))
+            # 2. Upload the RIPS file information, meanwhile
             self.upload_rips_file(tipo_id=tipo_id, file_name=filepath)
-            # 3. Get the URL necessary to upload the file to Google
-            url_google_file = self.get_url_upload_file()
+            try:
+                url_google_file = url_request.result()
+            except RequestException:
+                # e.g. a 401, requested again from the worker, where the token can be renewed
+                url_google_file = self.get_url_upload_file()
             # 4. Upload file to google based on URL to be requested
             self.upload_to_google(filepath, url_google_file.root[f"{self.codigo}.zip"])
             # 5. Uploads the file to the API
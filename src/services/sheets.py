@@ -1,32 +1,60 @@
+import math
+from functools import cached_property
 from typing import List
 
 import gspread
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from gspread_dataframe import set_with_dataframe
+from gspread.utils import absolute_range_name, rowcol_to_a1
 from gspread_formatting.dataframe import format_with_dataframe
 from pandas import DataFrame
 from pydantic.v1.validators import max_str_int
-from tenacity import retry, stop_after_attempt, wait_fixed
+from googleapiclient.errors import HttpError
+from httplib2.error import ServerNotFoundError
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 
-from src.constants import SPREADSHEET_ID, GOOGLE_TOKEN, GOOGLE_REFRESH_TOKEN, GOOGLE_TOKEN_URI, \
-    GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_SCOPES
+from src.constants import SPREADSHEET_ID
+from src.services.credentials import google_credentials
+from src.services.discovery import build_service
+
+# Statuses of the Sheets API worth retrying: quota exceeded and temporary server errors.
+_RETRYABLE_STATUSES = (429, 503, 504)
+# Longest wait between attempts, even when Retry-After asks for more.
+SHEETS_MAX_WAIT = 60
+
+
+def is_retryable_error(exception: BaseException) -> bool:
+    """Determines if a failed request to Sheets is worth retrying, the other errors would fail again."""
+    if isinstance(exception, HttpError):
+        return exception.resp.status in _RETRYABLE_STATUSES
+    # socket.timeout is TimeoutError, and httplib2 raises ServerNotFoundError when the DNS lookup fails
+    return isinstance(exception, (TimeoutError, ConnectionError, ServerNotFoundError))
+
+
+_exponential_wait = wait_random_exponential(multiplier=1, max=SHEETS_MAX_WAIT)
+
+
+def wait_retry_after(retry_state: RetryCallState) -> float:
+    """Waits the seconds of the Retry-After header when the API sends it, otherwise backs off exponentially."""
+    exception = retry_state.outcome.exception()
+    if isinstance(exception, HttpError) and (retry_after := exception.resp.get('retry-after', '')).isdigit():
+        return min(float(retry_after), SHEETS_MAX_WAIT)
+    return _exponential_wait(retry_state)
+
+
+sheets_retry = retry(stop=stop_after_attempt(6), wait=wait_retry_after,
+                     retry=retry_if_exception(is_retryable_error), reraise=True)
 
 
 class GoogleSheets:
     def __init__(self):
-        self.creds = Credentials(
-            token=GOOGLE_TOKEN,
-            refresh_token=GOOGLE_REFRESH_TOKEN,
-            token_uri=GOOGLE_TOKEN_URI,
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-            scopes=GOOGLE_SCOPES
-        )
-        self.service = build('sheets', 'v4', credentials=self.creds)
+        self.creds = google_credentials()
         self.spreadsheet_id = SPREADSHEET_ID
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1))
+    @cached_property
+    def service(self):
+        """Client of the Sheets API, built on first use."""
+        return build_service('sheets', 'v4', self.creds)
+
+    @sheets_retry
     def get_values(self, range_name: str) -> List[List[str]]:
         """
         Gets values from a spreadsheet.
@@ -37,7 +65,7 @@ class GoogleSheets:
         ).execute()
         return result.get('values', [])
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1))
+    @sheets_retry
     def append_values(self, range_name: str, values: List[List[str]]) -> dict:
         """
         Appends values to a spreadsheet.
@@ -53,7 +81,7 @@ class GoogleSheets:
         ).execute()
         return result
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1))
+    @sheets_retry
     def update_values(self, range_name: str, values: List[List[str]]) -> dict:
         """
         Updates values in a spreadsheet.
@@ -69,7 +97,7 @@ class GoogleSheets:
         ).execute()
         return result
 
-    @retry(stop=stop_after_attempt(10), wait=wait_fixed(1))
+    @sheets_retry
     def clear_values(self, range_name: str) -> dict:
         """
         Clears values from a spreadsheet.
@@ -84,19 +112,26 @@ class GoogleSheets:
 
 class GSpreadSheets:
     def __init__(self):
-        self.creds = Credentials(
-            token=GOOGLE_TOKEN,
-            refresh_token=GOOGLE_REFRESH_TOKEN,
-            token_uri=GOOGLE_TOKEN_URI,
-            client_id=GOOGLE_CLIENT_ID,
-            client_secret=GOOGLE_CLIENT_SECRET,
-            scopes=GOOGLE_SCOPES
-        )
-        self.gc = gspread.authorize(self.creds)
-        self.spreadsheet = self.gc.open_by_key(SPREADSHEET_ID)
-
-    @property
+        self.creds = google_credentials()
+        # Writes queued by queue_row and queue_cell, sent together by flush
+        self._pending_rows: List[list] = []
+        self._pending_cells: List[dict] = []
+        # If the worksheet already has data below the header, probed once and then kept up to date
+        self._header_ready = False
+
+    @cached_property
+    def gc(self) -> gspread.Client:
+        """gspread client, authorized on first use."""
+        return gspread.authorize(self.creds)
+
+    @cached_property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        """Spreadsheet of the reports, opened on first use since opening it requests the API."""
+        return self.gc.open_by_key(SPREADSHEET_ID)
+
+    @cached_property
     def control_worksheet(self) -> gspread.Worksheet:
+        """Worksheet 'CONTROL', fetched once per instance instead of on every access."""
         return self.spreadsheet.worksheet('CONTROL')
 
     def get_all_records(self) -> List[dict]:
@@ -107,25 +142,108 @@ class GSpreadSheets:
         """Appends a row to the worksheet."""
         self.control_worksheet.append_row(values)
 
+    def queue_row(self, values: List[str]) -> None:
+        """Queues a row to be appended to the worksheet on the next flush."""
+        self._pending_rows.append(values)
+
+    def append_rows(self, rows: List[list]) -> dict:
+        """Appends several rows to the worksheet in a single request."""
+        return self.control_worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+
     def update_cell(self, row: int, col: int, value: str) -> dict:
         """Updates a cell in the worksheet."""
         self.control_worksheet.update_cell(row, col, value)
 
+    def queue_cell(self, row: int, col: int, value: str) -> None:
+        """Queues a cell to be updated in the worksheet on the next flush."""
+        range_name = absolute_range_name(self.control_worksheet.title, rowcol_to_a1(row, col))
+        self._pending_cells.append({'range': range_name, 'values': [[value]]})
+
+    def flush(self) -> None:
+        """
+        Sends the writes queued by queue_row and queue_cell.
+
+        The cells are updated with a single values:batchUpdate request and the rows appended with
+        another one, instead of one request per write.
+        """
+        if self._pending_cells:
+            self.spreadsheet.values_batch_update(
+                {'valueInputOption': 'USER_ENTERED', 'data': self._pending_cells})
+            self._pending_cells = []
+        if self._pending_rows:
+            self.append_rows(self._pending_rows)
+            self._pending_rows = []
+
     def clear_worksheet(self) -> dict:
-        """Clears the worksheet."""
+        """Clears the worksheet, so the next DataFrame inserted is written with its header again."""
         self.control_worksheet.clear()
+        self._header_ready = False
 
-    def write_df_to_worksheet(self, df: DataFrame):
-        """Writes pandas DataFrame to Google Sheets' worksheet."""
-        set_with_dataframe(self.control_worksheet, df)
-        format_with_dataframe(self.control_worksheet, df, include_column_header=True)
+    def write_df_to_worksheet(self, df: DataFrame, apply_format: bool = False):
+        """
+        Writes pandas DataFrame to Google Sheets' worksheet, formatting its cells only if apply_format is True.
+
+        The header and the values are sent in a single values:update request, missing values as empty cells.
+        """
+        worksheet = self.control_worksheet
+        values = [df.columns.tolist(), *df.astype(object).where(df.notna(), '').values.tolist()]
+        # The grid is not expanded by values:update, so the worksheet must fit the DataFrame
+        if (missing_rows := len(values) - worksheet.row_count) > 0:
+            worksheet.add_rows(missing_rows)
+        if (missing_cols := len(df.columns) - worksheet.col_count) > 0:
+            worksheet.add_cols(missing_cols)
+        self.spreadsheet.values_update(absolute_range_name(worksheet.title, 'A1'),
+                                       params={'valueInputOption': 'USER_ENTERED'}, body={'values': values})
+        if apply_format:
+            format_with_dataframe(self.control_worksheet, df, include_column_header=True)
+
+    def insert_rows_after_header(self, rows: List[list]) -> dict:
+        """
+        Inserts the rows after the header row, shifting existing data down.
+
+        The new rows and their values are sent in a single batchUpdate request,
+        instead of one request for the rows and another for the values.
+        """
+        worksheet = self.control_worksheet
+        body = {'requests': [
+            {'insertDimension': {
+                'range': {'sheetId': worksheet.id, 'dimension': 'ROWS', 'startIndex': 1, 'endIndex': 1 + len(rows)},
+                'inheritFromBefore': False,
+            }},
+            {'updateCells': {
+                'start': {'sheetId': worksheet.id, 'rowIndex': 1, 'columnIndex': 0},
+                'rows': [{'values': [_cell_data(value) for value in row]} for row in rows],
+                'fields': 'userEnteredValue',
+            }},
+        ]}
+        return self.spreadsheet.batch_update(body)
 
     def insert_dataframe(self, df: DataFrame):
-        """Inserts a DataFrame after the header row, shifting existing data down."""
-        if self.control_worksheet.acell('A2').value:
-            self.control_worksheet.insert_rows(df.values.tolist(), 2)
+        """
+        Inserts a DataFrame after the header row, shifting existing data down.
+
+        The worksheet is only probed for existing data the first time, the instance remembers it afterward.
+        When it is empty, the DataFrame is written with its header and formatted.
+        An empty DataFrame is not written at all.
+        """
+        if df.empty:
+            return
+        if self._header_ready or self.control_worksheet.acell('A2').value:
+            self.insert_rows_after_header(df.values.tolist())
         else:
-            self.write_df_to_worksheet(df)
+            self.write_df_to_worksheet(df, apply_format=True)
+        self._header_ready = True
+
+
+def _cell_data(value) -> dict:
+    """Builds the CellData of a value the same way it is stored when written as RAW input."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return {}
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
 
 
 if __name__ == '__main__':
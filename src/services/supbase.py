@@ -1,37 +1,69 @@
-from decouple import config
+import logging
 
+from postgrest import APIError
 from supabase import Client, create_client
 
+from src.settings import SETTINGS
+
+# src.config imports this module, so its logger can't be imported here
+log = logging.getLogger(__name__)
+
 CODE_ERROR_DUPLICATED_KEY = '23505'
+# Rows sent per request when inserting several rows, PostgREST receives them as a single JSON array.
+INSERT_BATCH_SIZE = 500
 
 
 class Supabase:
 
     def __init__(self):
-        self.client: Client = create_client(config('SUPABASE_URL'), config('SUPABASE_KEY'))
+        self.client: Client = create_client(SETTINGS.SUPABASE_URL, SETTINGS.SUPABASE_KEY)
 
     def insert(self, table_name: str, row: 'Record'):
         return self.client.table(table_name).insert(row.as_dict).execute()
 
+    def insert_many(self, table_name: str, rows: list['Record']) -> list:
+        """
+        Inserts several rows with one request per INSERT_BATCH_SIZE rows, instead of one request per row.
+
+        When a batch is rejected because of a duplicated key, its rows are inserted one by one,
+        so only the duplicated rows are left out.
+        """
+        responses = []
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            try:
+                responses.append(self.client.table(table_name).insert([row.as_dict for row in batch]).execute())
+            except APIError as batch_error:
+                if batch_error.code != CODE_ERROR_DUPLICATED_KEY:
+                    raise
+                for row in batch:
+                    try:
+                        responses.append(self.insert(table_name, row))
+                    except APIError as row_error:
+                        if row_error.code != CODE_ERROR_DUPLICATED_KEY:
+                            raise
+                        log.info("Registro duplicado en %s: %s", table_name, getattr(row_error, 'details', ''))
+        return responses
+
     def update(self, table_name: str, row: 'Record', **updates: dict):
+        """Updates the rows matching the non-empty values of the row."""
         query = self.client.table(table_name).update(updates)
-        for column, value in row.as_dict.items():
-            if value:
-                query = query.eq(column, value)
+        if filters := {column: value for column, value in row.as_dict.items() if value}:
+            query = query.match(filters)
         return query.execute()
 
     def delete(self, table_name: str, row: 'Record'):
-        """Fetches data from Supabase table."""
+        """Deletes the rows matching every value of the row."""
         query = self.client.table(table_name).delete()
-        for column, value in row.as_dict.items():
-            query = query.eq(column, value)
+        if filters := row.as_dict:
+            query = query.match(filters)
         return query.execute()
 
-    def fetch(self, table_name: str, columns: None = str, filter_eq: list = []):
-        """Fetches data from Supabase table."""
+    def fetch(self, table_name: str, columns: str | None = None, filter_eq: dict | None = None):
+        """Fetches data from Supabase table, filtered by the {column: value} of filter_eq."""
         query = self.client.table(table_name).select(columns or "*")
-        for column, value in filter_eq:
-            query = query.eq(column, value)
+        if filter_eq:
+            query = query.match(filter_eq)
         return query.execute()
 
 
@@ -0,0 +1,79 @@
+from dataclasses import dataclass
+
+from decouple import config, Csv
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Environment variables of the project, read only once when the module is imported."""
+    # Execution
+    IN_PRODUCTION: bool
+    TEST_MODE: bool
+
+    # Business
+    LOGI_NIT: str
+    USER_ID: str
+    MUTUALSER_USERNAME: str
+    MUTUALSER_PASSWORD: str
+    EMAILS_PER_EXECUTION: int
+    MAX_WORKERS: int
+
+    # Web
+    BASE_URL_AUTH: str
+    BASE_URL_API: str
+    PORTAL_URL: str
+
+    # External Services
+    GOOGLE_TOKEN: str
+    GOOGLE_REFRESH_TOKEN: str
+    GOOGLE_TOKEN_URI: str
+    GOOGLE_CLIENT_ID: str
+    GOOGLE_CLIENT_SECRET: str
+    GOOGLE_SCOPES: tuple[str, ...]
+
+    LOG_GOOGLE_TOKEN: str
+    LOG_GOOGLE_REFRESH_TOKEN: str
+    LOG_GOOGLE_CLIENT_ID: str
+    LOG_GOOGLE_CLIENT_SECRET: str
+    LOG_GOOGLE_SCOPES: tuple[str, ...]
+
+    # Spreadsheets
+    SPREADSHEET_ID: str
+
+    # Drive
+    FACTURAS_PDF: str
+    FACTURAS_PROCESADAS: str
+    FACTURAS_TMP: str
+    XMLS_MUTUALSER: str
+
+    # Supabase
+    SUPABASE_URL: str
+    SUPABASE_KEY: str
+    TABLE_FAC_PROCS: str
+
+    # Gmail
+    GMAIL_QUERY: str
+
+    # Emails
+    LOGIFARMA_ADMIN: str
+    LOGIFARMA_DEV: str
+
+    @classmethod
+    def from_env(cls) -> 'Settings':
+        """Reads every field from the environment (or .env file) casting the ones that are not strings."""
+        casts = {
+            'IN_PRODUCTION': {'default': False, 'cast': bool},
+            'TEST_MODE': {'default': False, 'cast': bool},
+            'EMAILS_PER_EXECUTION': {'cast': int},
+            'MAX_WORKERS': {'default': 8, 'cast': int},
+            'GOOGLE_SCOPES': {'cast': Csv(post_process=tuple)},
+            'LOG_GOOGLE_SCOPES': {'cast': Csv(post_process=tuple)},
+        }
+        env_names = {'IN_PRODUCTION': 'PRODUCTION'}
+        return cls(**{
+            name: config(env_names.get(name, name), **casts.get(name, {}))
+            for name in cls.__dataclass_fields__
+        })
+
+
+SETTINGS = Settings.from_env()
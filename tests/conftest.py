@@ -0,0 +1,10 @@
+import os
+
+# The tests don't use any Pydantic plugin, so the entry points are not scanned looking for them.
+# It must be set before the first model is built.
+os.environ.setdefault('PYDANTIC_DISABLE_PLUGINS', '1')
+
+
+def pytest_configure(config):
+    """Imports the models once per process (once per worker under xdist), before the tests are collected."""
+    import src.models.mutualser  # noqa: F401
@@ -0,0 +1,32 @@
+import unittest
+from datetime import datetime
+
+from src.resources.datetimes import in_business_hours, next_business_start, BOGOTA_TZ
+
+
+def bogota(day: int, hour: int, minute: int = 0) -> datetime:
+    """A moment of October 2026, the 10th is a Saturday and the 11th a Sunday."""
+    return datetime(2026, 10, day, hour, minute, tzinfo=BOGOTA_TZ)
+
+
+class TestInBusinessHours(unittest.TestCase):
+
+    def test_in_business_hours(self):
+        for moment, expected in [(bogota(12, 6), True), (bogota(12, 20, 59), True), (bogota(10, 12), True),
+                                 (bogota(12, 5, 59), False), (bogota(12, 21), False), (bogota(11, 12), False)]:
+            with self.subTest(moment=moment):
+                self.assertEqual(in_business_hours(moment), expected)
+
+
+class TestNextBusinessStart(unittest.TestCase):
+
+    def test_next_business_start(self):
+        for moment, expected in [
+            (bogota(12, 5, 30), bogota(12, 6)),  # before 6:00, the same day
+            (bogota(12, 21), bogota(13, 6)),  # at night, the next day
+            (bogota(10, 21), bogota(12, 6)),  # Saturday night, Monday
+            (bogota(11, 12), bogota(12, 6)),  # Sunday, Monday
+            (bogota(12, 6), bogota(13, 6)),  # the window just opened, the next one
+        ]:
+            with self.subTest(moment=moment):
+                self.assertEqual(next_business_start(moment), expected)
@@ -0,0 +1,43 @@
+import unittest
+
+from lxml import html
+
+from src.models.google import EmailMessage, _TOTAL_RE, _TOTAL_XPATH
+
+_BODY = """
+<html><body>
+<table>
+  <tr><td><b>Subtotal:</b></td><td>COP</td><td>1,000.00</td></tr>
+  <tr>
+    <td style="text-align: right"><b>Total:</b></td>
+    <td>COP</td>
+    <td style="text-align: right">1,234,567.00</td>
+  </tr>
+</table>
+</body></html>
+"""
+# The same invoice with layouts the regex doesn't follow: the value nested in another tag, and markup
+# in the cell after the label with one more cell in the row, which the regex must not take as the value.
+_OTHER_LAYOUT_BODY = _BODY.replace('1,234,567.00</td>', '<span>1,234,567.00</span></td>')
+_MARKUP_CELL_BODY = _BODY.replace('<td>COP</td>\n    <td style', '<td><span>COP</span></td>\n    <td style').replace(
+    '1,234,567.00</td>', '1,234,567.00</td><td>1.00</td>')
+
+
+class TestEmailMessageValorFactura(unittest.TestCase):
+
+    def test_regex_matches_xpath(self):
+        self.assertEqual(_TOTAL_RE.search(_BODY).group(1).strip(),
+                         _TOTAL_XPATH(html.fromstring(_BODY))[0].text_content().strip())
+
+    def test_regex_leaves_other_layouts_to_xpath(self):
+        for layout, body in [('nested value', _OTHER_LAYOUT_BODY), ('markup after label', _MARKUP_CELL_BODY)]:
+            with self.subTest(layout=layout):
+                self.assertIsNone(_TOTAL_RE.search(body))
+
+    def test_valor_factura(self):
+        for body in [_BODY, _OTHER_LAYOUT_BODY, _MARKUP_CELL_BODY]:
+            with self.subTest(regex=bool(_TOTAL_RE.search(body))):
+                self.assertEqual(EmailMessage(id='1', threadId='1', body_html=body).valor_factura, 1234567)
+
+    def test_valor_factura_without_body(self):
+        self.assertIsNone(EmailMessage(id='1', threadId='1').valor_factura)
@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from src import main
+from src.main import scheduled_run, POLL_MIN_MINUTES, POLL_MAX_MINUTES, JOB_ID
+from src.resources.datetimes import BOGOTA_TZ
+
+_MONDAY_NOON = datetime(2026, 10, 12, 12, tzinfo=BOGOTA_TZ)
+_SATURDAY_NIGHT = datetime(2026, 10, 10, 21, tzinfo=BOGOTA_TZ)
+
+
+class TestScheduledRun(unittest.TestCase):
+
+    def setUp(self):
+        main._poll['minutes'] = POLL_MIN_MINUTES
+        self.scheduler = mock.Mock()
+        self.scheduler.get_job.return_value.next_run_time = _MONDAY_NOON
+
+    def run_at(self, moment: datetime, processed: int) -> dict:
+        """Runs the job at the given moment with the amount of e-mails processed, returns the reschedule kwargs."""
+        with mock.patch.object(main, 'run_process', return_value=processed), \
+                mock.patch.object(main, 'colombia_now', return_value=moment):
+            scheduled_run(self.scheduler)
+        self.assertEqual(self.scheduler.reschedule_job.call_args.args, (JOB_ID,))
+        return self.scheduler.reschedule_job.call_args.kwargs
+
+    def test_interval_doubles_up_to_max_without_emails(self):
+        for expected in [10, 20, 40, POLL_MAX_MINUTES, POLL_MAX_MINUTES]:
+            with self.subTest(expected=expected):
+                kwargs = self.run_at(_MONDAY_NOON, processed=0)
+                self.assertEqual(kwargs['minutes'], expected)
+                self.assertIsNone(kwargs['start_date'])
+
+    def test_interval_resets_with_emails(self):
+        main._poll['minutes'] = 40
+        self.assertEqual(self.run_at(_MONDAY_NOON, processed=3)['minutes'], POLL_MIN_MINUTES)
+
+    def test_waits_for_monday_after_saturday_night(self):
+        main._poll['minutes'] = 40
+        kwargs = self.run_at(_SATURDAY_NIGHT, processed=0)
+        self.assertEqual(kwargs['minutes'], POLL_MIN_MINUTES)
+        self.assertEqual(kwargs['start_date'], datetime(2026, 10, 12, 6, tzinfo=BOGOTA_TZ))
@@ -1,164 +1,171 @@
 
 import unittest
-from unittest.mock import Mock, patch
-from uuid import UUID, uuid4
+from uuid import uuid4
 from datetime import datetime
 from pydantic import HttpUrl
 
 from src.models.mutualser import Mensaje, Archivo, FindLoadResponse, FileLinkResponse, FileLinkRequest, UploadFilesRequest
 
+_UID = uuid4()
+_NOW = datetime(2024, 1, 1)
+# Fields of an Archivo that no test asserts on
+_BASE_ARCHIVO = dict(id=_UID, idTipo=_UID, fechaCargue=_NOW, nombre='test', extension='zip', codigo='1')
+# Fields of a FindLoadResponse that no test asserts on
+_BASE_RESPONSE = dict(cantidad=1, email='test@test.com', estado='test', fecha=_NOW, id=_UID, nombres=['test'],
+                      organizacion='test', usuario='test', estadoValidaciones=None, nombreOrganizacion=None)
+_URL = HttpUrl('https://example.com')
 
-class TestMensaje(unittest.TestCase):
 
-    class TestSimplifiedDescription(unittest.TestCase):
+def make_archivo(**overrides) -> Archivo:
+    """Builds a loaded Archivo without messages, skipping validation since every value is already of its type."""
+    return Archivo.model_construct(**{**_BASE_ARCHIVO, 'estado': 'CARGADO', 'mensajes': [], **overrides})
 
-        def test_simplifies_unix_path(self):
-            mensaje = Mensaje(
-                codigo="1",
-                descripcion="El archivo /path/to/file.zip no contiene PDF.",
-                tipo="ERROR",
-                idArchivo=uuid4()
-            )
-            self.assertEqual(mensaje.simplified_description, "El archivo file.zip no contiene PDF.")
 
-        def test_simplifies_windows_path(self):
-            mensaje = Mensaje(
-                codigo="1",
-                descripcion=r"El archivo C:\Users\Test\file.zip no contiene PDF.",
-                tipo="ERROR",
-                idArchivo=uuid4()
-            )
-            self.assertEqual(mensaje.simplified_description, "El archivo file.zip no contiene PDF.")
+def make_mensaje(tipo: str = 'EXITOSO', codigo: str = '0', descripcion: str = 'ok') -> Mensaje:
+    """Builds a Mensaje without validation, for the tests that don't exercise Mensaje itself."""
+    return Mensaje.model_construct(tipo=tipo, codigo=codigo, descripcion=descripcion, idArchivo=_UID)
 
-        def test_no_path_in_description(self):
-            descripcion = "Descripción sin ruta de archivo."
-            mensaje = Mensaje(
-                codigo="2",
-                descripcion=descripcion,
-                tipo="INFO",
-                idArchivo=uuid4()
-            )
-            self.assertEqual(mensaje.simplified_description, descripcion)
 
+def make_response(**overrides) -> FindLoadResponse:
+    """Builds a FindLoadResponse without validation, the archivos are expected to be built by make_archivo."""
+    return FindLoadResponse.model_construct(**{**_BASE_RESPONSE, **overrides})
 
-class TestArchivo(unittest.TestCase):
 
-    class TestCargado(unittest.TestCase):
+class TestMensajeSimplifiedDescription(unittest.TestCase):
 
-        def test_cargado_true(self):
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            self.assertTrue(archivo.cargado)
+    def test_simplifies_unix_path(self):
+        mensaje = Mensaje(
+            codigo="1",
+            descripcion="El archivo /path/to/file.zip no contiene PDF.",
+            tipo="ERROR",
+            idArchivo=_UID
+        )
+        self.assertEqual(mensaje.simplified_description, "El archivo file.zip no contiene PDF.")
+
+    def test_simplifies_windows_path(self):
+        mensaje = Mensaje(
+            codigo="1",
+            descripcion=r"El archivo C:\Users\Test\file.zip no contiene PDF.",
+            tipo="ERROR",
+            idArchivo=_UID
+        )
+        self.assertEqual(mensaje.simplified_description, "El archivo file.zip no contiene PDF.")
+
+    def test_no_path_in_description(self):
+        descripcion = "Descripción sin ruta de archivo."
+        mensaje = Mensaje(
+            codigo="2",
+            descripcion=descripcion,
+            tipo="INFO",
+            idArchivo=_UID
+        )
+        self.assertEqual(mensaje.simplified_description, descripcion)
+
+
+class TestArchivoCargado(unittest.TestCase):
+
+    def test_cargado(self):
+        for estado, expected in [('CARGADO', True), ('PENDIENTE', False)]:
+            with self.subTest(estado=estado):
+                self.assertEqual(make_archivo(estado=estado).cargado, expected)
+
+
+class TestArchivoError(unittest.TestCase):
+
+    def test_error(self):
+        for estado, tipo, expected in [('ERROR', 'ERROR', True), ('CARGADO', 'EXITOSO', False)]:
+            with self.subTest(tipo=tipo):
+                mensaje = make_mensaje(tipo=tipo)
+                self.assertEqual(make_archivo(estado=estado, mensajes=[mensaje]).error, expected)
 
-        def test_cargado_false(self):
-            archivo = Archivo(estado='PENDIENTE', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            self.assertFalse(archivo.cargado)
 
-    class TestError(unittest.TestCase):
+class TestArchivoMotivoError(unittest.TestCase):
 
-        def test_error_true(self):
-            mensaje = Mensaje(tipo='ERROR', codigo='1', descripcion='error', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='ERROR', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertTrue(archivo.error)
+    def test_motivo_error_single(self):
+        mensaje = make_mensaje(tipo='ERROR', codigo='E1', descripcion='Error 1')
+        archivo = make_archivo(estado='ERROR', mensajes=[mensaje])
+        self.assertEqual(archivo.motivo_error, "E1. Error 1")
 
-        def test_error_false(self):
-            mensaje = Mensaje(tipo='EXITOSO', codigo='0', descripcion='exitoso', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertFalse(archivo.error)
+    def test_motivo_error_multiple(self):
+        mensaje1 = make_mensaje(tipo='ERROR', codigo='E1', descripcion='Error 1')
+        mensaje2 = make_mensaje(tipo='ERROR', codigo='E2', descripcion='Error 2')
+        archivo = make_archivo(estado='ERROR', mensajes=[mensaje1, mensaje2])
+        self.assertEqual(archivo.motivo_error, "E1. Error 1| E2. Error 2")
 
-    class TestMotivoError(unittest.TestCase):
 
-        def test_motivo_error_single(self):
-            mensaje = Mensaje(tipo='ERROR', codigo='E1', descripcion='Error 1', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='ERROR', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertEqual(archivo.motivo_error, "E1. Error 1")
+class TestArchivoExitoso(unittest.TestCase):
 
-        def test_motivo_error_multiple(self):
-            mensaje1 = Mensaje(tipo='ERROR', codigo='E1', descripcion='Error 1', idArchivo=uuid4())
-            mensaje2 = Mensaje(tipo='ERROR', codigo='E2', descripcion='Error 2', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje1, mensaje2], estado='ERROR', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertEqual(archivo.motivo_error, "E1. Error 1| E2. Error 2")
+    def test_exitoso(self):
+        for estado, tipo, expected in [('CARGADO', '', True), ('ERROR', 'ERROR', False)]:
+            with self.subTest(tipo=tipo):
+                mensaje = make_mensaje(tipo=tipo)
+                self.assertEqual(make_archivo(estado=estado, mensajes=[mensaje]).exitoso(), expected)
 
-    class TestExitoso(unittest.TestCase):
 
-        def test_exitoso_true(self):
-            mensaje = Mensaje(tipo='', codigo='0', descripcion='exitoso', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertTrue(archivo.exitoso())
+class TestArchivoMensajesExitosos(unittest.TestCase):
 
-        def test_exitoso_false(self):
-            mensaje = Mensaje(tipo='ERROR', codigo='1', descripcion='error', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='ERROR', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertFalse(archivo.exitoso())
+    def test_mensajes_exitosos(self):
+        mensaje = make_mensaje(tipo='ERROR')
+        for estado, mensajes, expected in [('CARGADO', [], True), ('ERROR', [mensaje], False)]:
+            with self.subTest(estado=estado):
+                self.assertEqual(make_archivo(estado=estado, mensajes=mensajes).sin_errores, expected)
 
-    class TestMensajesExitosos(unittest.TestCase):
 
-        def test_mensajes_exitosos_true(self):
-            mensaje = Mensaje(tipo='EXITOSO', codigo='0', descripcion='exitoso', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertTrue(archivo.sin_errores())
+class TestFindLoadResponsePrimerArchivo(unittest.TestCase):
 
-        def test_mensajes_exitosos_false(self):
-            mensaje = Mensaje(tipo='ERROR', codigo='1', descripcion='error', idArchivo=uuid4())
-            archivo = Archivo(mensajes=[mensaje], estado='ERROR', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1')
-            self.assertFalse(archivo.sin_errores())
+    def test_primer_archivo(self):
+        archivo = make_archivo()
+        response = make_response(archivos=[archivo])
+        self.assertEqual(response.primer_archivo, archivo)
 
 
-class TestFindLoadResponse(unittest.TestCase):
+class TestFindLoadResponseCargadoExitoso(unittest.TestCase):
 
-    class TestPrimerArchivo(unittest.TestCase):
+    def test_cargado_exitoso(self):
+        for mensajes, expected in [([], True), ([make_mensaje(tipo='ERROR')], False)]:
+            with self.subTest(expected=expected):
+                response = make_response(archivos=[make_archivo(mensajes=mensajes)])
+                self.assertEqual(response.cargado_exitoso, expected)
 
-        def test_primer_archivo(self):
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='test', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertEqual(response.primer_archivo, archivo)
 
-    class TestCargadoExitoso(unittest.TestCase):
+class TestFindLoadResponseEstadoBasadoEnArchivos(unittest.TestCase):
 
-        @patch('src.models.mutualser.Archivo.sin_errores', new_callable=Mock)
-        def test_cargado_exitoso_true(self, mock_mensajes_exitosos):
-            mock_mensajes_exitosos.return_value = True
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            archivo.mensajes_exitosos = True
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='test', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertTrue(response.cargado_exitoso)
+    def test_estado_from_archivo(self):
+        archivo = make_archivo()
+        response = make_response(archivos=[archivo], estado='PENDIENTE')
+        self.assertEqual(response.estado_basado_en_archivos, 'CARGADO')
 
-    class TestEstadoBasadoEnArchivos(unittest.TestCase):
+    def test_estado_from_root(self):
+        response = make_response(archivos=[], cantidad=0, estado='PENDIENTE')
+        self.assertEqual(response.estado_basado_en_archivos, 'PENDIENTE')
 
-        def test_estado_from_archivo(self):
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='PENDIENTE', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertEqual(response.estado_basado_en_archivos, 'CARGADO')
 
-        def test_estado_from_root(self):
-            response = FindLoadResponse(archivos=[], cantidad=0, email='test@test.com', estado='PENDIENTE', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertEqual(response.estado_basado_en_archivos, 'PENDIENTE')
+class TestFindLoadResponseDone(unittest.TestCase):
 
-    class TestDone(unittest.TestCase):
+    def test_done_true(self):
+        archivo = make_archivo()
+        response = make_response(archivos=[archivo])
+        self.assertTrue(response.done)
 
-        def test_done_true(self):
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='test', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertTrue(response.done)
+    def test_done_false(self):
+        archivo = make_archivo(estado='PENDIENTE')
+        response = make_response(archivos=[archivo])
+        self.assertFalse(response.done)
 
-        def test_done_false(self):
-            archivo = Archivo(estado='PENDIENTE', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='test', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertFalse(response.done)
 
-    class TestUnicoArchivo(unittest.TestCase):
+class TestFindLoadResponseUnicoArchivo(unittest.TestCase):
 
-        def test_unico_archivo(self):
-            archivo = Archivo(estado='CARGADO', id=uuid4(), idTipo=uuid4(), fechaCargue=datetime.now(), nombre='test', extension='zip', codigo='1', mensajes=[])
-            response = FindLoadResponse(archivos=[archivo], cantidad=1, email='test@test.com', estado='test', fecha=datetime.now(), id=uuid4(), nombres=['test'], organizacion='test', usuario='test')
-            self.assertEqual(response.unico_archivo, archivo)
+    def test_unico_archivo(self):
+        archivo = make_archivo()
+        response = make_response(archivos=[archivo])
+        self.assertEqual(response.unico_archivo, archivo)
 
 
 class TestFileLinkResponse(unittest.TestCase):
 
     def test_instantiation(self):
-        url = HttpUrl('https://example.com')
-        response = FileLinkResponse.model_validate({'file.zip': url})
-        self.assertEqual(response.root['file.zip'], url)
+        response = FileLinkResponse.model_validate({'file.zip': _URL})
+        self.assertEqual(response.root['file.zip'], _URL)
 
 
 class TestFileLinkRequest(unittest.TestCase):
@@ -174,11 +181,11 @@ class TestUploadFilesRequest(unittest.TestCase):
         request = UploadFilesRequest(
             codigo='1',
             mensajes=[],
-            id_archivo=uuid4(),
-            id_cargue=uuid4(),
+            id_archivo=_UID,
+            id_cargue=_UID,
             extension='zip',
             tamano=123.45,
-            id_tipo=uuid4(),
+            id_tipo=_UID,
             nombre='test.zip'
         )
         self.assertEqual(request.nombre, 'test.zip')
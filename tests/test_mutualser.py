@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from src.resources.exceptions import ServiceUnavailableError
+from src.services.mutualser import MutualSerAPIClient
+
+
+def make_http_response(status_code: int, content: bytes = b'{}') -> requests.Response:
+    """Builds the response of a request to the API with the given status."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.url = 'https://api.test'
+    return response
+
+
+class TestTokenRequiredRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MutualSerAPIClient()
+        self.client.access_token = 'token'
+        self.client.codigo = '1'
+        self.request = mock.patch.object(self.client.session, 'request').start()
+        mock.patch('src.services.mutualser.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_retries_connection_error_and_503(self):
+        self.request.side_effect = [requests.ConnectionError('refused'), make_http_response(503),
+                                    make_http_response(200, b'{"1.zip": "https://storage.test/1.zip"}')]
+        response = self.client.get_url_upload_file()
+        self.assertEqual(str(response.root['1.zip']), 'https://storage.test/1.zip')
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_raises_service_unavailable_after_max_retries(self):
+        self.request.return_value = make_http_response(503)
+        with self.assertRaises(ServiceUnavailableError):
+            self.client.get_url_upload_file()
+        self.assertEqual(self.request.call_count, MutualSerAPIClient.MAX_RETRIES)
+
+    def test_client_error_is_not_retried(self):
+        self.request.return_value = make_http_response(400)
+        with self.assertRaises(requests.HTTPError):
+            self.client.get_url_upload_file()
+        self.assertEqual(self.request.call_count, 1)
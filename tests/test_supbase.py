@@ -0,0 +1,63 @@
+import unittest
+from types import SimpleNamespace
+
+from postgrest import APIError
+
+from src.services.supbase import Supabase, CODE_ERROR_DUPLICATED_KEY
+
+
+class StubClient:
+    """Supabase client whose table rejects every insert holding an existing id, as a duplicated key."""
+
+    def __init__(self, existing_ids: set[int], code: str = CODE_ERROR_DUPLICATED_KEY):
+        self.existing_ids = existing_ids
+        self.code = code
+        self.inserted = []
+        self.requests = 0
+
+    def table(self, table_name: str) -> 'StubClient':
+        return self
+
+    def insert(self, payload: dict | list[dict]) -> 'StubClient':
+        self.payload = payload if isinstance(payload, list) else [payload]
+        return self
+
+    def execute(self) -> list[dict]:
+        self.requests += 1
+        if any(row['id'] in self.existing_ids for row in self.payload):
+            raise APIError({'code': self.code, 'details': 'duplicated id', 'message': 'error', 'hint': None})
+        self.inserted.extend(self.payload)
+        return self.payload
+
+
+def make_supabase(client: StubClient) -> Supabase:
+    """Builds the service around the stub, without creating a real client."""
+    supabase = Supabase.__new__(Supabase)
+    supabase.client = client
+    return supabase
+
+
+class TestSupabaseInsertMany(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [SimpleNamespace(as_dict={'id': row_id}) for row_id in (1, 2, 3)]
+
+    def test_inserts_in_one_request(self):
+        client = StubClient(existing_ids=set())
+        make_supabase(client).insert_many('facturas', self.rows)
+        self.assertEqual(client.requests, 1)
+        self.assertEqual(client.inserted, [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    def test_duplicated_key_falls_back_to_row_by_row(self):
+        client = StubClient(existing_ids={2})
+        with self.assertLogs('src.services.supbase', 'INFO') as logs:
+            make_supabase(client).insert_many('facturas', self.rows)
+        self.assertEqual(client.requests, 4)
+        self.assertEqual(client.inserted, [{'id': 1}, {'id': 3}])
+        self.assertEqual(logs.records[0].getMessage(), "Registro duplicado en facturas: duplicated id")
+
+    def test_other_errors_are_raised(self):
+        client = StubClient(existing_ids={2}, code='42P01')
+        with self.assertRaises(APIError):
+            make_supabase(client).insert_many('facturas', self.rows)
+        self.assertEqual(client.requests, 1)